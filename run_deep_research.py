@@ -3,7 +3,7 @@ import json
 import argparse
 import os
 import threading
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
 from huggingface_hub import login
@@ -14,8 +14,10 @@ from smolagents import (
     ToolCallingAgent
 )
 from scripts.smolagents_portkey_support import PortkeyModel
+from scripts.llm_metrics import get_recorder
+from scripts.tracing import instrument_agent
 from scripts.portkey_api import o3minihigh
-from run_deep_research_ts import research_topic
+from run_deep_research_ts import research_many, research_topic
 # Get environment variables
 firecrawl_key = os.getenv('FIRECRAWL_KEY')
 context_size = os.getenv('CONTEXT_SIZE')
@@ -67,6 +69,12 @@ def parse_args():
     parser.add_argument("--b", type=int, default=2, help="Research breadth (3-10)")
     parser.add_argument("--d", type=int, default=2, help="Research depth (1-5)")
     parser.add_argument("--questions", action="store_true", help="Enable clarifying questions")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Maximum concurrent searches and LLM calls of the research engine (default: RESEARCH_CONCURRENCY or 8)",
+    )
     return parser.parse_args()
 
 
@@ -87,12 +95,24 @@ custom_role_conversions = {"tool-call": "assistant", "tool-response": "user"}
 #     return "This is a test"
 
 @tool
-def research_tool(query: str) -> str:
+def research_tool(
+    query: str,
+    max_learnings: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> str:
     """
     Perform deep research on a given topic.
     
     Args:
         query: The research query/topic
+        max_learnings: Optional. Stop researching once this many learnings were found, for a quicker but shallower answer.
+        deadline_s: Optional. Stop researching after this many seconds and report on what was found.
+        max_llm_calls: Optional. Stop researching after this many LLM calls.
+        max_tokens: Optional. Stop researching after this many LLM tokens.
+        max_pages: Optional. Stop researching after scraping this many pages.
     
     Returns:
         dict: Research results containing learnings and visited URLs
@@ -103,7 +123,49 @@ def research_tool(query: str) -> str:
     """
     breadth = 2
     depth = 2
-    return research_topic(query, breadth, depth)
+    return research_topic(
+        query,
+        breadth,
+        depth,
+        max_learnings=max_learnings,
+        deadline_s=deadline_s,
+        max_llm_calls=max_llm_calls,
+        max_tokens=max_tokens,
+        max_pages=max_pages,
+    )
+
+@tool
+def research_many_tool(
+    queries: list,
+    deadline_s: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> dict:
+    """
+    Perform deep research on several topics in parallel. Much faster than calling research_tool once per topic.
+
+    Args:
+        queries: The research queries/topics, as a list of strings
+        deadline_s: Optional. Stop researching each topic after this many seconds and report on what was found.
+        max_llm_calls: Optional. Stop researching each topic after this many LLM calls.
+        max_tokens: Optional. Stop researching each topic after this many LLM tokens.
+        max_pages: Optional. Stop researching each topic after scraping this many pages.
+
+    Returns:
+        dict: One report section per query, with the merged learnings and visited URLs of all queries
+    """
+    breadth = 2
+    depth = 2
+    return research_many(
+        queries,
+        breadth,
+        depth,
+        deadline_s=deadline_s,
+        max_llm_calls=max_llm_calls,
+        max_tokens=max_tokens,
+        max_pages=max_pages,
+    )
 
 def ask_clarifying_questions(query: str) -> list:
     """
@@ -131,6 +193,9 @@ Query:
 
 def main():
     args = parse_args()
+    if args.concurrency:
+        # Read by the research worker when it starts, and shared by all research_tool calls
+        os.environ["RESEARCH_CONCURRENCY"] = str(args.concurrency)
 
     # Prompt user for research query
     if not args.question:
@@ -169,6 +234,7 @@ def main():
     - Search multiple related queries to find different perspectives and sources!
     - Cross-reference information from multiple sources to provide complete and accurate answers!
     - Don't stop at just 1-2 reseach_tool calls - aim to call it as many times as needed, minimum 2 times! In one code block you can call the research_tool as many times as needed, minimum 2 times!
+    - To research several topics at once, pass them all to research_many_tool: they are researched in parallel!
     - Make sure to ALWAYS return source URLs in your answer!
     - Retain and include all relevant information provided by the tool in your answer!
     """)
@@ -182,7 +248,7 @@ def main():
     if agent_type == 'code':
         manager_agent = CodeAgent(
             model=model,
-            tools=[research_tool],
+            tools=[research_tool, research_many_tool],
             max_steps=12,
             verbosity_level=2,
             planning_interval=4,
@@ -192,15 +258,17 @@ def main():
     else:
         manager_agent = ToolCallingAgent(
             model=model,
-            tools=[research_tool],
+            tools=[research_tool, research_many_tool],
             max_steps=12,
             verbosity_level=2,
             planning_interval=4,
             system_prompt=manager_agent_system_prompt
         )
 
+    instrument_agent(manager_agent)
     answer = manager_agent.run(enhanced_query)
     print(f"Got this answer: {answer}")
+    print(f"LLM usage: {get_recorder().summary()}")
 
 
 if __name__ == "__main__":
@@ -2,15 +2,29 @@ import subprocess
 import os
 import json
 import argparse
-from typing import Dict, Any
+import contextvars
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
 
 from dotenv import load_dotenv
 from scripts.portkey_api import o3minihigh
+from scripts.research_worker import ResearchBudget, ResearchWorkerError, get_research_worker
+from scripts.tracing import span
 
 # Load environment variables
 load_dotenv()
 
-def research_topic(query: str, breadth: int = 4, depth: int = 2) -> dict:
+def research_topic(
+    query: str,
+    breadth: int = 4,
+    depth: int = 2,
+    max_learnings: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    max_pages: Optional[int] = None,
+) -> dict:
     """
     Perform deep research on a given topic.
     
@@ -18,15 +32,131 @@ def research_topic(query: str, breadth: int = 4, depth: int = 2) -> dict:
         query (str): The research query/topic
         breadth (int): Research breadth parameter (recommended: 3-10, default: 4)
         depth (int): Research depth parameter (recommended: 1-5, default: 2)
+        max_learnings (int): Stop researching once this many learnings were found and report on those.
+            Requires the research worker.
+        deadline_s (float): Stop researching after this many seconds. The report is written after it.
+        max_llm_calls (int): Stop researching after this many LLM calls
+        max_tokens (int): Stop researching after this many LLM tokens
+        max_pages (int): Stop researching after scraping this many pages
     
     Returns:
-        dict: Research results containing learnings and visited URLs
+        dict: Research results: the report ("output"), "learnings", "visited_urls", phase "timings" in ms,
+            whether the research was "stopped" early and the "budget" it used
         
     Raises:
         FileNotFoundError: If environment file is missing
         subprocess.CalledProcessError: If TypeScript process fails
     """
-    
+    budget = ResearchBudget(deadline_s, max_llm_calls, max_tokens, max_pages)
+    with span("research_topic", query=query, breadth=breadth, depth=depth, **budget.to_params()) as research_span:
+        if max_learnings is not None:
+            result = _research_topic_until(query, breadth, depth, max_learnings, budget)
+        else:
+            result = _research_topic(query, breadth, depth, budget)
+        if research_span is not None:
+            if "error" in result:
+                research_span.status = "ERROR"
+            elif result.get("stopped"):
+                research_span.set_attribute("research.stopped_by", result["budget"].get("exhausted") or "cancel")
+        return result
+
+
+def stream_research_topic(
+    query: str,
+    breadth: int = 4,
+    depth: int = 2,
+    max_learnings: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    budget: Optional[ResearchBudget] = None,
+) -> Iterator[dict]:
+    """
+    Perform deep research on a given topic, yielding learnings as soon as they are found.
+
+    Args:
+        query (str): The research query/topic
+        breadth (int): Research breadth parameter
+        depth (int): Research depth parameter
+        max_learnings (int): Stop researching once this many learnings were found
+        deadline_s (float): Stop researching after this many seconds, report included
+        budget (ResearchBudget): Limits enforced by the research engine
+
+    Yields:
+        dict: {"type": "learnings", "query", "learnings", "visited_urls"} events, then a final
+            {"type": "result", ...} event with the same keys as research_topic's result.
+            Stopping the iteration stops the research.
+    """
+    worker = get_research_worker(_research_env())
+    events = worker.stream_research(
+        query, breadth, depth, max_learnings=max_learnings, deadline_s=deadline_s, budget=budget
+    )
+    for event in events:
+        if event["type"] == "result":
+            yield {"type": "result", **_format_result(event)}
+        else:
+            yield event
+
+
+def research_many(
+    queries: List[str],
+    breadth: int = 4,
+    depth: int = 2,
+    max_concurrency: Optional[int] = None,
+    **budget: Any,
+) -> dict:
+    """
+    Research several topics concurrently and merge the results.
+
+    Args:
+        queries (List[str]): The research queries/topics
+        breadth (int): Research breadth parameter of each query
+        depth (int): Research depth parameter of each query
+        max_concurrency (int): Maximum number of research jobs running at once.
+            Defaults to the RESEARCH_MAX_CONCURRENCY env var, or 4.
+        **budget: deadline_s, max_llm_calls, max_tokens and max_pages of each query, see research_topic
+
+    Returns:
+        dict: One report section per query ("output"), the deduplicated "learnings" and "visited_urls",
+            the "timings" of each query, and the "errors" of queries that failed
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "4"))
+    queries = list(dict.fromkeys(query.strip() for query in queries if query.strip()))
+    if not queries:
+        return {"error": "No queries given"}
+
+    with span("research_many", queries=len(queries), max_concurrency=max_concurrency):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(queries)))) as executor:
+            # Run each job in a copy of the caller's context so its spans nest under this one
+            futures = [
+                executor.submit(contextvars.copy_context().run, research_topic, query, breadth, depth, **budget)
+                for query in queries
+            ]
+            results = [future.result() for future in futures]
+
+    sections, errors, timings = [], {}, {}
+    learnings, visited_urls = {}, {}
+    for query, result in zip(queries, results):
+        if "error" in result:
+            errors[query] = result["error"]
+            continue
+        sections.append(f"# Research: {query}\n\n{result['output']}")
+        timings[query] = result["timings"]
+        learnings.update(dict.fromkeys(result["learnings"]))
+        visited_urls.update(dict.fromkeys(result["visited_urls"]))
+
+    merged = {
+        "output": "\n\n".join(sections),
+        "learnings": list(learnings),
+        "visited_urls": list(visited_urls),
+        "timings": timings,
+    }
+    if errors:
+        merged["errors"] = errors
+    return merged
+
+
+def _research_env() -> Dict[str, str]:
+    """Environment of the TS research process."""
     # Get environment variables
     firecrawl_key = os.getenv('FIRECRAWL_KEY')
     context_size = os.getenv('CONTEXT_SIZE')
@@ -51,82 +181,86 @@ def research_topic(query: str, breadth: int = 4, depth: int = 2) -> dict:
         'PORTKEY_VIRTUAL_KEY_OPENAI': portkey_virtual_key_openai,
         'PORTKEY_VIRTUAL_KEY_GOOGLE': portkey_virtual_key_google,
         'SERPAPI_API_KEY': serpapi_api_key,
+        'RESEARCH_CONCURRENCY': os.getenv('RESEARCH_CONCURRENCY'),
+        'RESEARCH_CACHE': os.getenv('RESEARCH_CACHE'),
+        'RESEARCH_CACHE_DIR': os.getenv('RESEARCH_CACHE_DIR'),
+        'RESEARCH_CACHE_TTL': os.getenv('RESEARCH_CACHE_TTL'),
         'PATH': os.environ.get('PATH', '')  # Include PATH from current environment
     }
+    # Unset variables can't be passed to a subprocess
+    return {name: value for name, value in env.items() if value is not None}
+
+
+def _format_result(result: Dict[str, Any]) -> dict:
+    """Convert the TS engine's result to the dict returned by research_topic."""
+    return {
+        "output": result["report"],
+        "learnings": result["learnings"],
+        "visited_urls": result["visitedUrls"],
+        "timings": result["timings"],
+        "stopped": result.get("stopped", False),
+        "budget": result.get("budget", {}),
+    }
+
+
+def _research_topic_with_worker(query: str, breadth: int, depth: int, budget: ResearchBudget) -> dict:
+    def print_progress(progress: Dict[str, Any]) -> None:
+        completed_depth = progress.get("totalDepth", 0) - progress.get("currentDepth", 0)
+        print(
+            f"Research progress: depth {completed_depth}/{progress.get('totalDepth')}, "
+            f"queries {progress.get('completedQueries')}/{progress.get('totalQueries')}, "
+            f"current: {progress.get('currentQuery', '')}"
+        )
 
-    # Format the command arguments
     try:
-        # Call tsx directly instead of using npm start
-        process = subprocess.Popen(
-            ['tsx', '--env-file=.env', 'src/run.ts', query, str(breadth), str(depth)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env=env,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+        result = get_research_worker(_research_env()).research(
+            query, breadth, depth, on_progress=print_progress, budget=budget
         )
-        
-        # Collect all output
-        full_output = []
-        while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                full_output.append(output.strip())
-                print(output.strip())  # Optional: Print output in real-time
-        
-        # Wait for the process to complete and get return code
-        return_code = process.wait()
-        
-        if return_code != 0:
-            stderr = process.stderr.read()
-            raise subprocess.CalledProcessError(return_code, ['tsx', '--env-file=.env', 'src/run.ts', query, str(breadth), str(depth)], stderr=stderr)
-        
-        # # Join all output lines and return as a dictionary
-        # complete_output = '\n'.join(full_output)
-        # try:
-        #     # Try to parse as JSON if the output is in JSON format
-        #     parsed_output = json.loads(complete_output)
-        #     print("Parsed JSON output:", parsed_output)
-            
-        #     # Print contents of output.md if it exists
-        #     try:
-        #         with open('output.md', 'r') as f:
-        #             print("\nOutput.md contents:")
-        #             print(f.read())
-        #     except FileNotFoundError:
-        #         print("\noutput.md file not found")
-                
-        #     return parsed_output
-        # except json.JSONDecodeError:
-        #     # If not JSON, return as string in a dictionary
-        #     output_dict = {"output": complete_output}
-        #     print("String output:", output_dict)
-            
-        #     # Print contents of output.md if it exists
-        #     try:
-        #         with open('output.md', 'r') as f:
-        #             print("\nOutput.md contents:")
-        #             print(f.read())
-        #     except FileNotFoundError:
-        #         print("\noutput.md file not found")
-                
-        #     return output_dict
-        
-                # Read and return contents of output.md
-        try:
-            with open('output.md', 'r') as f:
-                output_contents = f.read()
-            return {"output": output_contents}
-        except FileNotFoundError:
-            return {"error": "output.md file not found"}
-            
-    except subprocess.CalledProcessError as e:
+    except ResearchWorkerError as e:
         print(f"Error running research: {e}")
-        print(f"stderr: {e.stderr}")
-        return {"error": str(e), "stderr": e.stderr}
+        return {"error": str(e)}
+    return _format_result(result)
+
+
+def _research_topic_until(query: str, breadth: int, depth: int, max_learnings: int, budget: ResearchBudget) -> dict:
+    try:
+        for event in stream_research_topic(query, breadth, depth, max_learnings=max_learnings, budget=budget):
+            if event["type"] == "learnings":
+                print(f"Learned from '{event['query']}': {event['learnings']}")
+            else:
+                return {key: value for key, value in event.items() if key != "type"}
+    except ResearchWorkerError as e:
+        print(f"Error running research: {e}")
+        return {"error": str(e)}
+
+
+def _research_topic(query: str, breadth: int, depth: int, budget: ResearchBudget) -> dict:
+    # A fresh Node process per call pays for tsx transpilation and module init every time,
+    # so the persistent worker is used unless RESEARCH_USE_WORKER=0
+    if os.getenv("RESEARCH_USE_WORKER", "1") != "0":
+        return _research_topic_with_worker(query, breadth, depth, budget)
+
+    env = _research_env()
+
+    # Each call gets its own result file, so concurrent calls can't read each other's report
+    with tempfile.TemporaryDirectory(prefix="research-") as result_dir:
+        result_file = os.path.join(result_dir, "result.json")
+        command = ['tsx', '--env-file=.env', 'src/run.ts', query, str(breadth), str(depth), '--result-file', result_file]
+        command += budget.to_cli_args()
+        try:
+            # Call tsx directly instead of using npm start; its logs and progress go straight to the terminal
+            process = subprocess.Popen(command, stderr=subprocess.PIPE, env=env, text=True)
+            _, stderr = process.communicate()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+        except subprocess.CalledProcessError as e:
+            print(f"Error running research: {e}")
+            print(f"stderr: {e.stderr}")
+            return {"error": str(e), "stderr": e.stderr}
+
+        with open(result_file, 'r', encoding='utf-8') as f:
+            return _format_result(json.load(f))
+
 
 def ask_clarifying_questions(query: str) -> list:
     """
@@ -164,10 +298,22 @@ def parse_args():
     parser.add_argument("--b", type=int, default=2, help="Research breadth (3-10)")
     parser.add_argument("--d", type=int, default=2, help="Research depth (1-5)")
     parser.add_argument("--questions", action="store_true", help="Enable clarifying questions")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Maximum concurrent searches and LLM calls of the research engine (default: RESEARCH_CONCURRENCY or 8)",
+    )
+    parser.add_argument("--deadline-s", type=float, default=None, help="Stop researching after this many seconds")
+    parser.add_argument("--max-llm-calls", type=int, default=None, help="Stop researching after this many LLM calls")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Stop researching after this many LLM tokens")
+    parser.add_argument("--max-pages", type=int, default=None, help="Stop researching after this many scraped pages")
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_args()
+    if args.concurrency:
+        os.environ["RESEARCH_CONCURRENCY"] = str(args.concurrency)
     
     # Prompt user for research query
     if not args.question:
@@ -191,4 +337,16 @@ if __name__ == "__main__":
         
         print("\nEnhanced query with clarifying answers:", enhanced_query)
     
-    results = research_topic(enhanced_query, args.b, args.d)
+    results = research_topic(
+        enhanced_query,
+        args.b,
+        args.d,
+        deadline_s=args.deadline_s,
+        max_llm_calls=args.max_llm_calls,
+        max_tokens=args.max_tokens,
+        max_pages=args.max_pages,
+    )
+    if "output" in results:
+        print(f"\n\nFinal Report:\n\n{results['output']}")
+        print(f"\nTimings (ms): {results['timings']}")
+        print(f"Budget used: {results['budget']}")
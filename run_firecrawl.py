@@ -6,6 +6,8 @@ import threading
 from dotenv import load_dotenv
 from scripts.text_inspector_tool import TextInspectorTool
 from scripts.smolagents_portkey_support import PortkeyModel
+from scripts.llm_metrics import get_recorder
+from scripts.tracing import instrument_agent
 from firecrawl import FirecrawlApp
 
 from smolagents import (
@@ -261,8 +263,10 @@ def main():
             system_prompt=manager_agent_system_prompt
         )
 
+    instrument_agent(manager_agent)
     answer = manager_agent.run(enhanced_query)
     print(f"Got this answer: {answer}")
+    print(f"LLM usage: {get_recorder().summary()}")
 
 
 if __name__ == "__main__":
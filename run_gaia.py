@@ -1,16 +1,21 @@
 import argparse
 import json
 import os
+import socket
+import subprocess
+import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
 from datetime import datetime
-from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-import datasets
-import pandas as pd
 from dotenv import load_dotenv
-from huggingface_hub import login
+from scripts.answers_store import AnswersStore
+from scripts.gaia_dataset import load_gaia_dataset
+from scripts.gaia_scheduler import TaskAttempt, TaskScheduler, is_transient_error
+from scripts.gaia_sharding import TaskClaims, in_shard, parse_shard
+from scripts.llm_metrics import InstrumentedModel, call_context, get_recorder
+from scripts.rate_limiter import RateLimitedModel, configure_rate_limit, rate_limiter_stats
 from scripts.reformulator import prepare_response
 from scripts.run_agents import (
     get_single_file_description,
@@ -27,6 +32,7 @@ from scripts.text_web_browser import (
     SimpleTextBrowser,
     VisitTool,
 )
+from scripts.tracing import instrument_agent, span
 from scripts.visual_qa import visualizer
 from tqdm import tqdm
 
@@ -66,9 +72,6 @@ AUTHORIZED_IMPORTS = [
     "csv",
 ]
 load_dotenv(override=True)
-login(os.getenv("HF_TOKEN"))
-
-append_answer_lock = threading.Lock()
 
 
 def parse_args():
@@ -76,6 +79,27 @@ def parse_args():
     parser.add_argument("--concurrency", type=int, default=8)
     parser.add_argument("--model-id", type=str, default="o1")
     parser.add_argument("--run-name", type=str, required=True)
+    parser.add_argument("--rpm", type=float, default=None, help="Requests per minute budget shared by all tasks")
+    parser.add_argument("--tpm", type=float, default=None, help="Tokens per minute budget shared by all tasks")
+    parser.add_argument("--task-timeout", type=float, default=None, help="Wall-clock limit of each task in seconds")
+    parser.add_argument("--max-retries", type=int, default=2, help="Retries of a task failing with a transient error")
+    parser.add_argument(
+        "--order",
+        choices=["cost", "dataset"],
+        default="cost",
+        help="Start the most expensive tasks first (by level and attached file), or keep the dataset order",
+    )
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Only run shard i/N of the tasks, e.g. 0/4")
+    parser.add_argument(
+        "--claims-dir",
+        type=str,
+        default=None,
+        help="Directory shared by all processes of the run, in which each task is claimed by exactly one of them",
+    )
+    parser.add_argument("--claim-lease", type=float, default=600, help="Seconds after which a dead process's claims expire")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Run this many local processes sharing the tasks through claims"
+    )
     return parser.parse_args()
 
 
@@ -89,23 +113,6 @@ SET = "validation"
 
 custom_role_conversions = {"tool-call": "assistant", "tool-response": "user"}
 
-### LOAD EVALUATION DATASET
-
-eval_ds = datasets.load_dataset("gaia-benchmark/GAIA", "2023_all")[SET]
-eval_ds = eval_ds.rename_columns({"Question": "question", "Final answer": "true_answer", "Level": "task"})
-
-
-def preprocess_file_paths(row):
-    if len(row["file_name"]) > 0:
-        row["file_name"] = f"data/gaia/{SET}/" + row["file_name"]
-    return row
-
-
-eval_ds = eval_ds.map(preprocess_file_paths)
-eval_df = pd.DataFrame(eval_ds)
-print("Loaded evaluation dataset:")
-print(eval_df["task"].value_counts())
-
 user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
 
 BROWSER_CONFIG = {
@@ -121,13 +128,8 @@ BROWSER_CONFIG = {
 os.makedirs(f"./{BROWSER_CONFIG['downloads_folder']}", exist_ok=True)
 
 
-def create_agent_hierarchy(model: Model):
-    text_limit = 100000
-    ti_tool = TextInspectorTool(model, text_limit)
-
-    browser = SimpleTextBrowser(**BROWSER_CONFIG)
-
-    WEB_TOOLS = [
+def create_web_tools(browser: SimpleTextBrowser, ti_tool: TextInspectorTool) -> list:
+    return [
         SearchInformationTool(browser),
         VisitTool(browser),
         PageUpTool(browser),
@@ -135,10 +137,21 @@ def create_agent_hierarchy(model: Model):
         FinderTool(browser),
         FindNextTool(browser),
         ArchiveSearchTool(browser),
-        TextInspectorTool(model, text_limit),
+        ti_tool,
     ]
+
+
+def create_agent_hierarchy(
+    model: Model, web_tools: Optional[list] = None, ti_tool: Optional[TextInspectorTool] = None
+):
+    text_limit = 100000
+    ti_tool = ti_tool or TextInspectorTool(model, text_limit)
+
+    if web_tools is None:
+        web_tools = create_web_tools(SimpleTextBrowser(**BROWSER_CONFIG), TextInspectorTool(model, text_limit))
+    WEB_TOOLS = web_tools
     text_webbrowser_agent = ToolCallingAgent(
-        model=model,
+        model=InstrumentedModel(model, agent="search_agent"),
         tools=WEB_TOOLS,
         max_steps=20,
         verbosity_level=2,
@@ -157,7 +170,7 @@ def create_agent_hierarchy(model: Model):
     Additionally, if after some searching you find out that you need more information to answer the question, you can use `final_answer` with your request for clarification as argument to request for more information."""
 
     manager_agent = CodeAgent(
-        model=model,
+        model=InstrumentedModel(model, agent="manager"),
         tools=[visualizer, ti_tool],
         max_steps=12,
         verbosity_level=2,
@@ -168,31 +181,82 @@ def create_agent_hierarchy(model: Model):
     return manager_agent
 
 
-def append_answer(entry: dict, jsonl_file: str) -> None:
-    jsonl_file = Path(jsonl_file)
-    jsonl_file.parent.mkdir(parents=True, exist_ok=True)
-    with append_answer_lock, open(jsonl_file, "a", encoding="utf-8") as fp:
-        fp.write(json.dumps(entry) + "\n")
-    assert os.path.exists(jsonl_file), "File not found!"
-    print("Answer exported to file:", jsonl_file.resolve())
+class WorkerResources:
+    """Objects a worker thread reuses across the tasks it runs: the model, the browser with its HTTP session and
+    document converter, and the tools.
+
+    Tools keep no per-task state, and `reset()` clears the browser's history. Agents are still created for
+    each task, so their memory and Python interpreter state never leak from one task to the next.
+    """
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self.model = InstrumentedModel(
+            RateLimitedModel(
+                LiteLLMModel(
+                    model_id,
+                    custom_role_conversions=custom_role_conversions,
+                    max_completion_tokens=8192,
+                    reasoning_effort="high",
+                )
+            )
+        )
+        # model = HfApiModel("Qwen/Qwen2.5-72B-Instruct", provider="together")
+        #     "https://lnxyuvj02bpe6mam.us-east-1.aws.endpoints.huggingface.cloud",
+        #     custom_role_conversions=custom_role_conversions,
+        #     # provider="sambanova",
+        #     max_tokens=8096,
+        # )
+        self.text_inspector = TextInspectorTool(self.model, 100000)
+        self.browser = SimpleTextBrowser(**BROWSER_CONFIG)
+        self.web_tools = create_web_tools(self.browser, self.text_inspector)
 
+    def reset(self) -> None:
+        self.browser.reset()
 
-def answer_single_question(example, model_id, answers_file, visual_inspection_tool):
-    model = LiteLLMModel(
-        model_id,
-        custom_role_conversions=custom_role_conversions,
-        max_completion_tokens=8192,
-        reasoning_effort="high",
-    )
-    # model = HfApiModel("Qwen/Qwen2.5-72B-Instruct", provider="together")
-    #     "https://lnxyuvj02bpe6mam.us-east-1.aws.endpoints.huggingface.cloud",
-    #     custom_role_conversions=custom_role_conversions,
-    #     # provider="sambanova",
-    #     max_tokens=8096,
-    # )
-    document_inspection_tool = TextInspectorTool(model, 100000)
+    def create_agent(self):
+        return create_agent_hierarchy(self.model, self.web_tools, self.text_inspector)
 
-    agent = create_agent_hierarchy(model)
+
+_worker_local = threading.local()
+
+
+def get_worker_resources(model_id: str) -> WorkerResources:
+    """This thread's resources, reset for a new task."""
+    resources = getattr(_worker_local, "resources", None)
+    if resources is None or resources.model_id != model_id:
+        resources = _worker_local.resources = WorkerResources(model_id)
+    resources.reset()
+    return resources
+
+
+def append_answer(entry: dict, answers_store: AnswersStore) -> None:
+    answers_store.append(entry)
+    print("Answer exported to file:", os.path.abspath(answers_store.path))
+
+
+def answer_single_question(
+    example, model_id, answers_store: AnswersStore, visual_inspection_tool, attempt: TaskAttempt = None
+):
+    annotated_example = run_single_question(example, model_id, visual_inspection_tool, attempt)
+    append_answer(annotated_example, answers_store)
+
+
+def run_single_question(example, model_id, visual_inspection_tool, attempt: TaskAttempt = None) -> dict:
+    # Label every LLM call made for this task, so that its usage can be reported with the answer
+    with call_context(task_id=example["task_id"]), span("task", task_id=example["task_id"]):
+        return _run_single_question(example, model_id, visual_inspection_tool, attempt)
+
+
+def _run_single_question(example, model_id, visual_inspection_tool, attempt: TaskAttempt = None) -> dict:
+    resources = get_worker_resources(model_id)
+    model = resources.model
+    document_inspection_tool = resources.text_inspector
+
+    agent = instrument_agent(resources.create_agent())
+    if attempt is not None:
+        # Stop the agents after their current step once the task ran out of time
+        attempt.install(agent)
 
     augmented_question = """You have one question to answer. It is paramount that you provide a correct answer.
 Give it all you can: I know for a fact that you have access to all the relevant tools to solve it and find the correct answer (the answer does exist). Failure or 'I cannot answer' or 'None found' will not be tolerated, success will be rewarded.
@@ -215,12 +279,15 @@ Here is the task:
 
     start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
+        if attempt is not None:
+            attempt.check()
         # Run agent 🚀
         final_result = agent.run(augmented_question)
 
         agent_memory = agent.write_memory_to_messages(summary_mode=True)
 
-        final_result = prepare_response(augmented_question, agent_memory, reformulation_model=model)
+        with call_context(agent="reformulator"):
+            final_result = prepare_response(augmented_question, agent_memory, reformulation_model=model)
 
         output = str(final_result)
         for memory_step in agent.memory.steps:
@@ -235,6 +302,9 @@ Here is the task:
         raised_exception = False
 
     except Exception as e:
+        # Let the scheduler run the task again, unless this was its last attempt
+        if attempt is not None and not attempt.is_last and is_transient_error(e):
+            raise
         print("Error on ", augmented_question, e)
         output = None
         intermediate_steps = []
@@ -257,41 +327,97 @@ Here is the task:
         "task": example["task"],
         "task_id": example["task_id"],
         "true_answer": example["true_answer"],
+        "llm_usage": get_recorder().summary(task_id=example["task_id"]),
+        "attempt": attempt.number if attempt is not None else 1,
     }
-    append_answer(annotated_example, answers_file)
+    return annotated_example
 
 
-def get_examples_to_answer(answers_file, eval_ds) -> List[dict]:
-    print(f"Loading answers from {answers_file}...")
-    try:
-        done_questions = pd.read_json(answers_file, lines=True)["question"].tolist()
-        print(f"Found {len(done_questions)} previous results!")
-    except Exception as e:
-        print("Error when loading records: ", e)
-        print("No usable records! ▶️ Starting new.")
-        done_questions = []
-    return [line for line in eval_ds.to_list() if line["question"] not in done_questions]
+def get_examples_to_answer(answers_store: AnswersStore, eval_ds) -> List[dict]:
+    print(f"Found {len(answers_store)} previous results in {answers_store.path}")
+    return [line for line in eval_ds.to_list() if line["task_id"] not in answers_store]
+
+
+def run_processes(args) -> int:
+    """Run `args.processes` copies of this script, sharing the tasks through a claims directory."""
+    argv = []
+    skip = False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+        elif arg == "--processes":
+            skip = True
+        elif not arg.startswith("--processes="):
+            argv.append(arg)
+    claims_dir = args.claims_dir or f"output/{SET}/{args.run_name}_claims"
+    # Download and snapshot the dataset once, rather than in every process
+    load_gaia_dataset(SET)
+    command = [sys.executable, os.path.abspath(__file__), *argv, "--processes", "1", "--claims-dir", claims_dir]
+    children = [subprocess.Popen(command) for _ in range(args.processes)]
+    return max(child.wait() for child in children)
 
 
 def main():
     args = parse_args()
+    if args.processes > 1:
+        sys.exit(run_processes(args))
     print(f"Starting run with arguments: {args}")
 
-    answers_file = f"output/{SET}/{args.run_name}.jsonl"
-    tasks_to_run = get_examples_to_answer(answers_file, eval_ds)
-
-    with ThreadPoolExecutor(max_workers=args.concurrency) as exe:
-        futures = [
-            exe.submit(answer_single_question, example, args.model_id, answers_file, visualizer)
-            for example in tasks_to_run
-        ]
-        for f in tqdm(as_completed(futures), total=len(tasks_to_run), desc="Processing tasks"):
-            f.result()
+    eval_ds = load_gaia_dataset(SET)
+    print("Loaded evaluation dataset:", dict(sorted(Counter(eval_ds["task"]).items())))
+
+    answers_store = AnswersStore(f"output/{SET}/{args.run_name}.jsonl")
+    tasks_to_run = get_examples_to_answer(answers_store, eval_ds)
+    if args.shard is not None:
+        tasks_to_run = [example for example in tasks_to_run if in_shard(example["task_id"], *args.shard)]
+        print(f"Running {len(tasks_to_run)} tasks of shard {args.shard[0]}/{args.shard[1]}")
+    claims = TaskClaims(args.claims_dir, lease=args.claim_lease) if args.claims_dir else None
+    if args.rpm is not None or args.tpm is not None:
+        configure_rate_limit(args.model_id, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    def run_task(example, attempt: TaskAttempt) -> bool:
+        """Answer a task, unless another process claimed it. Returns whether it was run here."""
+        if claims is not None and attempt.number == 1 and not claims.claim(example["task_id"]):
+            return False
+        try:
+            answer_single_question(example, args.model_id, answers_store, visualizer, attempt)
+        except Exception as e:
+            if claims is not None and (attempt.is_last or not is_transient_error(e)):
+                claims.release(example["task_id"])
+            raise
+        if claims is not None:
+            claims.complete(example["task_id"])
+        return True
+
+    scheduler = TaskScheduler(
+        run_task,
+        max_workers=args.concurrency,
+        timeout=args.task_timeout,
+        max_retries=args.max_retries,
+        cost=(lambda example: 0) if args.order == "dataset" else None,
+    )
+    progress = tqdm(scheduler.run(tasks_to_run), total=len(tasks_to_run), desc="Processing tasks")
+    for outcome in progress:
+        if outcome.error is not None:
+            print(f"Task {outcome.task['task_id']} failed after {outcome.attempts} attempt(s): {outcome.error}")
+        postfix = {"running": scheduler.running(), "queued": scheduler.queued()}
+        limiter_stats = rate_limiter_stats().get(args.model_id)
+        if limiter_stats is not None:
+            postfix.update(queue=limiter_stats["queue_depth"], in_flight=limiter_stats["in_flight"])
+        progress.set_postfix(**postfix)
 
     # for example in tasks_to_run:
-    #     answer_single_question(example, args.model_id, answers_file, visualizer)
+    #     answer_single_question(example, args.model_id, answers_store, visualizer)
+    answers_store.close()
     print("All tasks processed.")
 
+    # Processes sharing the run each export their own calls
+    worker_suffix = f".{socket.gethostname()}.{os.getpid()}" if args.shard or claims else ""
+    llm_calls_file = f"output/{SET}/{args.run_name}_llm_calls{worker_suffix}.jsonl"
+    get_recorder().export_jsonl(llm_calls_file)
+    print("LLM usage per agent:", json.dumps(get_recorder().summary_by("agent"), indent=2))
+    print("LLM calls exported to file:", llm_calls_file)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+
+
+class AnswersStore:
+    """Append-only JSONL file of task answers, indexed in memory by task_id.
+
+    The file keeps the format `pd.read_json(path, lines=True)` reads. Opening it scans it once to map
+    each task_id to the offset of its latest record; `refresh()` then only reads what other processes
+    appended since. Each record is written with a single O_APPEND write, so processes sharing the file
+    never interleave. A crash can at worst leave a truncated last line: it is ignored when reading, and
+    moved to `<path>.partial` before the next write.
+
+    Writes are fsynced in batches: after `fsync_every` records or `fsync_interval` seconds, whichever
+    comes first, and on `flush()` / `close()`.
+
+    Parameters:
+        path (`str`): JSONL file, created on first write.
+        fsync_every (`int`, default `16`): Records written between two fsyncs.
+        fsync_interval (`float`, default `5.0`): Seconds after which pending records are fsynced anyway.
+    """
+
+    _UNSCANNED = -1
+
+    def __init__(self, path: str, fsync_every: int = 16, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._offsets: Dict[str, int] = {}
+        self._scanned = 0
+        self._fd: Optional[int] = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self) -> int:
+        """Index the records appended since the last scan. Returns how many were found."""
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return 0
+            found = 0
+            with f:
+                f.seek(self._scanned)
+                offset = self._scanned
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Truncated by a crash, or still being written by another process
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    task_id = record.get("task_id") if isinstance(record, dict) else None
+                    if task_id is not None:
+                        self._offsets[task_id] = offset
+                        found += 1
+                    offset += len(line)
+                self._scanned = offset
+            return found
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def done_task_ids(self) -> Set[str]:
+        return set(self._offsets)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Latest record of a task, read from disk."""
+        if self._offsets.get(task_id) == self._UNSCANNED:
+            self.refresh()
+        offset = self._offsets.get(task_id)
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Latest record of each task, in file order."""
+        with self._lock:
+            if self._UNSCANNED in self._offsets.values():
+                self.refresh()
+            offsets = sorted(self._offsets.values())
+        if not offsets:
+            return
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def _open(self) -> int:
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._drop_partial_line()
+        return self._fd
+
+    def _drop_partial_line(self) -> None:
+        """Move a last line cut short by a crash to `<path>.partial` and truncate the file before it.
+
+        Left in place, the next record would be appended after it and the broken line would end up in
+        the middle of the file, where `pd.read_json(lines=True)` fails on it.
+        """
+        with open(self.path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                block = f.read(end - start)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end == size:
+                return
+            f.seek(end)
+            fragment = f.read()
+        with open(f"{self.path}.partial", "ab") as partial:
+            partial.write(fragment + b"\n")
+        os.truncate(self.path, end)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        data = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            fd = self._open()
+            os.write(fd, data)
+            # Other processes may append next to us, so the offset is only known once the record is scanned
+            self._offsets[entry["task_id"]] = self._UNSCANNED
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """fsync the records written so far."""
+        with self._lock:
+            if self._fd is not None and self._unsynced:
+                os.fsync(self._fd)
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self) -> "AnswersStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
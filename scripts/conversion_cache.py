@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from .mdconvert import DocumentConverterResult, MarkdownConverter
+
+
+class LRUCache:
+    """A small thread-safe in-memory LRU cache."""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def file_fingerprint(path: str) -> Tuple[str, int, int]:
+    """Return a cheap identity for a local file: (absolute path, mtime in ns, size)."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the sha256 of a local file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Caches MarkdownConverter results for local files.
+
+    Entries are keyed by (path, mtime, size), so editing or replacing a file invalidates its entry.
+    Results live in an in-memory LRU and, if `cache_dir` is set, are also persisted as JSON files so
+    that other processes and later runs can reuse them.
+
+    Parameters:
+        max_entries (`int`): Number of converted documents kept in memory.
+        cache_dir (`str`, *optional*): Directory for on-disk persistence. Disabled if None.
+    """
+
+    def __init__(self, max_entries: int = 64, cache_dir: Optional[str] = None):
+        self._memory = LRUCache(max_entries)
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        # One lock per key so that concurrent requests for the same file only convert it once
+        self._key_locks: dict = {}
+        self._key_locks_lock = threading.Lock()
+
+    def _disk_path(self, key: Tuple[str, int, int]) -> str:
+        digest = hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".json")
+
+    def _load_from_disk(self, key) -> Optional[DocumentConverterResult]:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return DocumentConverterResult(title=data["title"], text_content=data["text_content"])
+
+    def _save_to_disk(self, key, result: DocumentConverterResult) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        title = result.title if isinstance(result.title, str) or result.title is None else str(result.title)
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"path": key[0], "title": title, "text_content": result.text_content}, fh)
+        os.replace(tmp_path, path)
+
+    def _lock_for(self, key) -> threading.Lock:
+        with self._key_locks_lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_or_convert(
+        self, path: str, convert: Callable[[str], DocumentConverterResult]
+    ) -> DocumentConverterResult:
+        """Return the cached conversion of `path`, calling `convert(path)` on a miss."""
+        key = file_fingerprint(path)
+        result = self._memory.get(key)
+        if result is not None:
+            return result
+        with self._lock_for(key):
+            result = self._memory.get(key)
+            if result is None:
+                result = self._load_from_disk(key)
+                if result is None:
+                    result = convert(path)
+                    self._save_to_disk(key, result)
+                self._memory.put(key, result)
+        with self._key_locks_lock:
+            self._key_locks.pop(key, None)
+        return result
+
+    def clear(self) -> None:
+        """Empty the in-memory cache. On-disk entries are kept."""
+        self._memory.clear()
+
+
+class CachedMarkdownConverter:
+    """Wraps a MarkdownConverter so that conversions of local files go through a ConversionCache.
+
+    URLs, streams and HTTP responses are passed through to the wrapped converter unchanged, and so are ZIP
+    archives: converting one extracts it, and a cache hit would leave the extracted files missing.
+    """
+
+    def __init__(self, converter: Optional[MarkdownConverter] = None, cache: Optional[ConversionCache] = None):
+        self._converter = converter if converter is not None else MarkdownConverter()
+        self._cache = cache
+
+    @property
+    def cache(self) -> ConversionCache:
+        # Resolved lazily so that environment variables loaded after import are honored
+        return self._cache if self._cache is not None else get_conversion_cache()
+
+    @staticmethod
+    def _is_cacheable(path: str) -> bool:
+        return not path.lower().endswith(".zip")
+
+    def convert(self, source: Any, **kwargs: Any) -> DocumentConverterResult:
+        if isinstance(source, str) and not kwargs and os.path.isfile(source) and self._is_cacheable(source):
+            return self.cache.get_or_convert(source, self._converter.convert_local)
+        return self._converter.convert(source, **kwargs)
+
+    def convert_local(self, path: str, **kwargs: Any) -> DocumentConverterResult:
+        if kwargs or not self._is_cacheable(path):
+            return self._converter.convert_local(path, **kwargs)
+        return self.cache.get_or_convert(path, self._converter.convert_local)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for missing attributes: before __init__ has run (e.g. while unpickling or copying),
+        # forwarding to self._converter would look it up here again and recurse forever
+        if name == "_converter":
+            raise AttributeError(name)
+        return getattr(self._converter, name)
+
+
+_default_cache: Optional[ConversionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_conversion_cache() -> ConversionCache:
+    """Return the process-wide ConversionCache.
+
+    Its on-disk persistence is controlled by the CONVERSION_CACHE_DIR environment variable.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ConversionCache(
+                max_entries=int(os.getenv("CONVERSION_CACHE_SIZE", "64")),
+                cache_dir=os.getenv("CONVERSION_CACHE_DIR") or None,
+            )
+        return _default_cache
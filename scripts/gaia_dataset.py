@@ -0,0 +1,48 @@
+import functools
+import os
+from typing import Optional
+
+
+# Snapshots of the preprocessed splits, so runs after the first one need neither the hub nor a login
+DEFAULT_SNAPSHOT_DIR = "data/gaia"
+
+
+def preprocess_file_paths(row, split: str):
+    if len(row["file_name"]) > 0:
+        row["file_name"] = f"data/gaia/{split}/" + row["file_name"]
+    return row
+
+
+def snapshot_path(split: str, snapshot_dir: Optional[str] = None) -> str:
+    return os.path.join(snapshot_dir or os.getenv("GAIA_SNAPSHOT_DIR") or DEFAULT_SNAPSHOT_DIR, f"{split}.parquet")
+
+
+@functools.lru_cache(maxsize=None)
+def load_gaia_dataset(split: str = "validation", snapshot_dir: Optional[str] = None, refresh: bool = False):
+    """Load a GAIA split with renamed columns and resolved file paths, as a `datasets.Dataset`.
+
+    The preprocessed split is saved as a Parquet snapshot on first load and read from it afterwards,
+    so only the first load downloads from the hub (logging in with HF_TOKEN). Pass `refresh=True`
+    to download it again. The attached files themselves are expected under `data/gaia/<split>`.
+    """
+    # datasets takes about a second to import, so only callers that need the tasks pay for it
+    import datasets
+
+    path = snapshot_path(split, snapshot_dir)
+    if os.path.exists(path) and not refresh:
+        return datasets.Dataset.from_parquet(path)
+
+    from huggingface_hub import login
+
+    if os.getenv("HF_TOKEN"):
+        login(os.getenv("HF_TOKEN"))
+    eval_ds = datasets.load_dataset("gaia-benchmark/GAIA", "2023_all")[split]
+    eval_ds = eval_ds.rename_columns({"Question": "question", "Final answer": "true_answer", "Level": "task"})
+    eval_ds = eval_ds.map(preprocess_file_paths, fn_kwargs={"split": split})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write then rename, so an interrupted save never leaves a partial snapshot behind
+    tmp = f"{path}.{os.getpid()}.tmp"
+    eval_ds.to_parquet(tmp)
+    os.replace(tmp, path)
+    return eval_ds
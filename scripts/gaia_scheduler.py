@@ -0,0 +1,226 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .llm_resilience import RetryPolicy, is_retryable
+
+
+# Relative cost of a GAIA task, from its level and the type of its attached file. Only the order
+# matters: the most expensive tasks start first, so the longest ones don't end up in the tail.
+LEVEL_COSTS = {"1": 1.0, "2": 2.0, "3": 4.0}
+FILE_COSTS = {
+    ".zip": 2.0,
+    ".mp3": 1.5,
+    ".mp4": 1.5,
+    ".wav": 1.5,
+    ".pdf": 1.3,
+    ".xlsx": 1.3,
+    ".docx": 1.3,
+    ".pptx": 1.3,
+    ".png": 1.2,
+    ".jpg": 1.2,
+}
+
+
+def estimate_task_cost(example: Dict[str, Any]) -> float:
+    cost = LEVEL_COSTS.get(str(example.get("task")), 2.0)
+    file_name = example.get("file_name") or ""
+    if file_name:
+        cost *= FILE_COSTS.get(os.path.splitext(file_name)[1].lower(), 1.1)
+    return cost
+
+
+class TaskTimeout(Exception):
+    """Raised in a task's agents when the task ran out of time."""
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Errors worth running the whole task again for: rate limits, server errors, dropped connections."""
+    return not isinstance(error, TaskTimeout) and is_retryable(error, RetryPolicy())
+
+
+@dataclass
+class TaskAttempt:
+    """One attempt at running a task, handed to the task function so it can honor the time limit.
+
+    The scheduler sets `cancel_event` once `timeout` seconds have passed. Agents can't be interrupted in
+    the middle of a step, so the task function must call `check()` between its own stages, and `install()`
+    its agents so they raise TaskTimeout after their current step.
+    """
+
+    number: int
+    max_attempts: int
+    timeout: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def is_last(self) -> bool:
+        return self.number >= self.max_attempts
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def check(self) -> None:
+        if self.cancel_event.is_set():
+            raise TaskTimeout(f"Task timed out after {self.elapsed():.0f}s (limit {self.timeout:.0f}s)")
+
+    def step_callback(self, step_log, agent=None) -> None:
+        self.check()
+
+    def install(self, agent) -> Any:
+        """Make `agent` and its managed agents stop after their current step once the attempt is cancelled."""
+        agent.step_callbacks.append(self.step_callback)
+        for managed_agent in (getattr(agent, "managed_agents", None) or {}).values():
+            # smolagents<1.8 wraps managed agents in a ManagedAgent holding the actual agent
+            self.install(getattr(managed_agent, "agent", managed_agent))
+        return agent
+
+
+@dataclass
+class TaskOutcome:
+    task: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+    attempts: int = 1
+    duration: float = 0.0
+
+
+class TaskScheduler:
+    """Runs tasks on a pool of worker threads, most expensive first, with a time limit and retries.
+
+    Workers pull the next task from a shared priority queue as soon as they are free, so they all stay busy
+    until the queue is empty. A task function that raises a transient error (see `is_transient_error`) is
+    run again after a backoff, up to `max_retries` times; its retries go back to the queue with their
+    original priority.
+
+    Parameters:
+        fn (`Callable[[Any, TaskAttempt], Any]`): Runs one task. Gets the task and the current attempt.
+        max_workers (`int`): Number of tasks run concurrently.
+        timeout (`float`, *optional*): Wall-clock limit of each attempt in seconds, enforced through
+            `TaskAttempt.cancel_event`. No limit by default.
+        max_retries (`int`, default `2`): Number of extra attempts after a transient error.
+        cost (`Callable[[Any], float]`, *optional*): Expected cost of a task. Defaults to `estimate_task_cost`.
+            Pass `lambda task: 0` to keep the input order.
+        retry_policy (`RetryPolicy`, *optional*): Backoff between attempts.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[Any, TaskAttempt], Any],
+        max_workers: int,
+        timeout: Optional[float] = None,
+        max_retries: int = 2,
+        cost: Optional[Callable[[Any], float]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self.fn = fn
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cost = cost or estimate_task_cost
+        self.retry_policy = retry_policy or RetryPolicy(base_delay=5.0)
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._remaining = 0
+        self._running: Dict[int, TaskAttempt] = {}
+        self._closed = False
+
+    def _push(self, priority: float, task: Any, attempt_number: int, first_started_at: Optional[float]) -> None:
+        with self._condition:
+            heapq.heappush(self._heap, (priority, next(self._sequence), task, attempt_number, first_started_at))
+            self._condition.notify()
+
+    def _next(self) -> Optional[tuple]:
+        with self._condition:
+            while not self._heap and self._remaining > 0 and not self._closed:
+                self._condition.wait()
+            if self._closed or not self._heap:
+                return None
+            return heapq.heappop(self._heap)
+
+    def _finish(self, outcomes: queue.Queue, outcome: TaskOutcome) -> None:
+        with self._condition:
+            self._remaining -= 1
+            self._condition.notify_all()
+        outcomes.put(outcome)
+
+    def _work(self, outcomes: queue.Queue) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            priority, _, task, attempt_number, first_started_at = item
+            attempt = TaskAttempt(attempt_number, self.max_retries + 1, self.timeout)
+            first_started_at = first_started_at or attempt.started_at
+            timer = None
+            if self.timeout is not None:
+                timer = threading.Timer(self.timeout, attempt.cancel)
+                timer.daemon = True
+                timer.start()
+            with self._condition:
+                self._running[threading.get_ident()] = attempt
+            try:
+                result = self.fn(task, attempt)
+            except Exception as e:
+                if not attempt.is_last and not self._closed and is_transient_error(e):
+                    print(f"Transient error on attempt {attempt_number}, retrying task: {e}")
+                    delay = self.retry_policy.delay(attempt_number - 1)
+                    retry = threading.Timer(delay, self._push, (priority, task, attempt_number + 1, first_started_at))
+                    retry.daemon = True
+                    retry.start()
+                else:
+                    self._finish(outcomes, TaskOutcome(task, None, e, attempt_number, time.monotonic() - first_started_at))
+            else:
+                self._finish(outcomes, TaskOutcome(task, result, None, attempt_number, time.monotonic() - first_started_at))
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                with self._condition:
+                    self._running.pop(threading.get_ident(), None)
+
+    def running(self) -> int:
+        with self._condition:
+            return len(self._running)
+
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def run(self, tasks: Iterable[Any]) -> Iterator[TaskOutcome]:
+        """Run all tasks, yielding their outcomes as they complete. Stopping the iteration cancels the rest."""
+        tasks = list(tasks)
+        with self._condition:
+            self._closed = False
+            self._remaining = len(tasks)
+            for task in tasks:
+                heapq.heappush(self._heap, (-self.cost(task), next(self._sequence), task, 1, None))
+
+        outcomes: queue.Queue = queue.Queue()
+        workers = [
+            threading.Thread(target=self._work, args=(outcomes,), name=f"gaia-worker-{i}", daemon=True)
+            for i in range(min(self.max_workers, len(tasks)))
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for _ in range(len(tasks)):
+                yield outcomes.get()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._heap.clear()
+                for attempt in self._running.values():
+                    attempt.cancel()
+                self._condition.notify_all()
+            for worker in workers:
+                worker.join()
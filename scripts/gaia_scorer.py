@@ -1,13 +1,23 @@
+import argparse
+import functools
+import os
 import re
 import string
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, List, Optional, Union
+
+
+# Normalizers are built once rather than on every comparison
+_WHITESPACE = re.compile(r"\s")
+_PUNCTUATION_TRANSLATOR = str.maketrans("", "", string.punctuation)
+_NUMBER_CHARS_TRANSLATOR = str.maketrans("", "", "$%,")
 
 
 def normalize_number_str(number_str: str) -> float:
     # we replace these common units and commas to allow
     # conversion to float
-    for char in ["$", "%", ","]:
-        number_str = number_str.replace(char, "")
+    number_str = number_str.translate(_NUMBER_CHARS_TRANSLATOR)
     try:
         return float(number_str)
     except ValueError:
@@ -19,8 +29,12 @@ def split_string(
     s: str,
     char_list: list[str] = [",", ";"],
 ) -> list[str]:
-    pattern = f"[{''.join(char_list)}]"
-    return re.split(pattern, s)
+    return _separator_pattern(tuple(char_list)).split(s)
+
+
+@functools.lru_cache(maxsize=None)
+def _separator_pattern(char_list: tuple) -> re.Pattern:
+    return re.compile(f"[{''.join(char_list)}]")
 
 
 def is_float(element: any) -> bool:
@@ -114,11 +128,143 @@ def normalize_str(input_str, remove_punct=True) -> str:
     - str, the normalized string
     """
     # Remove all white spaces. Required e.g for seagull vs. sea gull
-    no_spaces = re.sub(r"\s", "", input_str)
+    no_spaces = _WHITESPACE.sub("", input_str)
 
     # Remove punctuation, if specified.
     if remove_punct:
-        translator = str.maketrans("", "", string.punctuation)
-        return no_spaces.lower().translate(translator)
+        return no_spaces.lower().translate(_PUNCTUATION_TRANSLATOR)
     else:
         return no_spaces.lower()
+
+
+# Batch scoring of answer files, e.g. python -m scripts.gaia_scorer output/validation/*.jsonl
+
+# Below this many distinct answers, starting worker processes costs more than it saves
+MIN_PARALLEL_PAIRS = 2000
+
+USAGE_COLUMNS = ["calls", "prompt_tokens", "completion_tokens", "cost"]
+
+
+def _score_pair(pair: tuple) -> tuple:
+    prediction, true_answer = pair
+    with warnings.catch_warnings():
+        # Mismatched list lengths are common and already scored as wrong
+        warnings.simplefilter("ignore", UserWarning)
+        is_correct = question_scorer(prediction, true_answer)
+    return is_correct, check_close_call(prediction, true_answer, is_correct)
+
+
+def score_pairs(pairs: List[tuple], processes: Optional[int] = None) -> List[tuple]:
+    """Score (prediction, true_answer) pairs, returning (is_correct, is_close_call) for each.
+
+    Each distinct pair is only scored once. Many distinct pairs are spread over `processes` worker
+    processes (one per CPU by default, `1` to stay in this process).
+    """
+    unique_pairs = list(dict.fromkeys(pairs))
+    if processes == 1 or len(unique_pairs) < MIN_PARALLEL_PAIRS:
+        results = list(map(_score_pair, unique_pairs))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_score_pair, unique_pairs, chunksize=256))
+    scores = dict(zip(unique_pairs, results))
+    return [scores[pair] for pair in pairs]
+
+
+def load_answers(answers: Union[str, Iterable[str], Any]):
+    """Answers as a DataFrame, from a DataFrame, an answers JSONL file or several of them.
+
+    Files are read like run_gaia.py resumes them: the latest answer of each task_id, ignoring a truncated
+    last line. Each row gets a "run" column with the name of its file.
+    """
+    import pandas as pd
+
+    from .answers_store import AnswersStore
+
+    if isinstance(answers, pd.DataFrame):
+        return answers
+    paths = [answers] if isinstance(answers, str) else list(answers)
+    frames = []
+    for path in paths:
+        frame = pd.DataFrame(list(AnswersStore(path)))
+        frame["run"] = os.path.splitext(os.path.basename(path))[0]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def score_answers(answers: Union[str, Iterable[str], Any], processes: Optional[int] = None):
+    """Score answers (see `load_answers`), adding columns:
+
+    - "is_correct" and "is_close_call", from `question_scorer` and `check_close_call`
+    - "duration", in seconds, from "start_time" and "end_time"
+    - "calls", "prompt_tokens", "completion_tokens" and "cost", from "llm_usage"
+    """
+    import pandas as pd
+
+    scores = load_answers(answers).copy()
+    if scores.empty:
+        return scores
+    pairs = [
+        (str(prediction), str(true_answer))
+        for prediction, true_answer in zip(scores["prediction"], scores["true_answer"])
+    ]
+    results = score_pairs(pairs, processes)
+    scores["is_correct"] = [is_correct for is_correct, _ in results]
+    scores["is_close_call"] = [is_close_call for _, is_close_call in results]
+    if "start_time" in scores and "end_time" in scores:
+        duration = pd.to_datetime(scores["end_time"]) - pd.to_datetime(scores["start_time"])
+        scores["duration"] = duration.dt.total_seconds()
+    if "llm_usage" in scores:
+        usage = pd.DataFrame([u if isinstance(u, dict) else {} for u in scores["llm_usage"]], index=scores.index)
+        for column in USAGE_COLUMNS:
+            if column in usage:
+                scores[column] = usage[column]
+    return scores
+
+
+def summarize_scores(scores, by: Union[str, List[str]] = "task"):
+    """Accuracy, latency and token usage per group, e.g. per level or per run and level.
+
+    Each group of the first columns of `by` also gets an "all" row over the values of its last column.
+    """
+    import pandas as pd
+
+    by = [by] if isinstance(by, str) else list(by)
+    aggregations = {
+        "tasks": ("is_correct", "size"),
+        "accuracy": ("is_correct", "mean"),
+        "close_call_accuracy": ("is_close_call", "mean"),
+    }
+    if "duration" in scores:
+        aggregations["mean_duration"] = ("duration", "mean")
+        aggregations["p90_duration"] = ("duration", lambda duration: duration.quantile(0.9))
+    for column in USAGE_COLUMNS:
+        if column in scores:
+            aggregations[f"mean_{column}"] = (column, "mean")
+    if "cost" in scores:
+        aggregations["total_cost"] = ("cost", "sum")
+
+    totals = scores.assign(**{by[-1]: "all"})
+    with_totals = pd.concat([scores.astype({by[-1]: str}), totals], ignore_index=True)
+    return with_totals.groupby(by).agg(**aggregations).round(3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score GAIA answer files and report accuracy per level.")
+    parser.add_argument("answers", nargs="+", help="Answer JSONL files written by run_gaia.py")
+    parser.add_argument("--by", nargs="+", default=None, help="Columns to group by (default: run and task)")
+    parser.add_argument("--processes", type=int, default=None, help="Scoring processes (default: one per CPU)")
+    parser.add_argument("--output", type=str, default=None, help="Also write the scored answers to this JSONL file")
+    args = parser.parse_args()
+
+    scores = score_answers(args.answers, processes=args.processes)
+    if scores.empty:
+        print("No answers found.")
+        return
+    print(summarize_scores(scores, by=args.by or ["run", "task"]).to_string())
+    if args.output:
+        scores.to_json(args.output, orient="records", lines=True)
+        print("Scored answers exported to file:", args.output)
+
+
+if __name__ == "__main__":
+    main()
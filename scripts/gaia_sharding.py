@@ -0,0 +1,152 @@
+"""Split a GAIA run across processes and machines sharing one output directory.
+
+Two mechanisms, which can be combined:
+
+- Static shards (`--shard i/N`): each process only runs the tasks whose task_id hashes to its shard.
+- Claims (`--claims-dir`): before running a task, a process claims it by creating a file in a shared
+  directory with O_CREAT | O_EXCL, which succeeds for exactly one process. Claims of a process that died
+  expire after a lease, and are then taken over. Processes pull tasks as they go, so fast ones take
+  more of them.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse "i/N" (0 <= i < N) into (i, N)."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, expected i/N") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}, expected 0 <= i < N")
+    return index, count
+
+
+def in_shard(task_id: str, index: int, count: int) -> bool:
+    """Whether a task belongs to shard `index` of `count`. Stable across processes, machines and Python versions."""
+    digest = hashlib.sha1(task_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index
+
+
+class TaskClaims:
+    """Exactly-once claiming of tasks among processes sharing `directory`, e.g. over NFS.
+
+    A claim is a `<task_id>.claim` file holding its owner. While a task runs its claim is refreshed every
+    `lease / 3` seconds; a claim not refreshed for `lease` seconds belongs to a dead process and can be
+    taken over. Claims of completed tasks never expire.
+
+    Parameters:
+        directory (`str`): Directory shared by all processes of the run.
+        lease (`float`, default `600`): Seconds after which the claim of a silent process expires.
+            Must be larger than the longest time a process can go without running its heartbeat thread.
+    """
+
+    def __init__(self, directory: str, lease: float = 600.0):
+        self.directory = directory
+        self.lease = lease
+        self.owner = {"host": socket.gethostname(), "pid": os.getpid()}
+        self._held: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.directory, f"{task_id}.claim")
+
+    def _create(self, path: str, done: bool = False) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({**self.owner, "claimed_at": time.time(), "done": done}, f)
+        return True
+
+    def _is_expired(self, path: str) -> bool:
+        try:
+            with open(path, encoding="utf-8") as f:
+                claim = json.load(f)
+            return not claim.get("done") and time.time() - os.path.getmtime(path) > self.lease
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            # Being written by its owner right now, or garbage: judge by age alone
+            try:
+                return time.time() - os.path.getmtime(path) > self.lease
+            except FileNotFoundError:
+                return False
+
+    def _take_over(self, path: str) -> bool:
+        # Rename the expired claim away: only one process can move a given file
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return self._create(path)
+        if not self._is_expired(stale):
+            # Another process replaced the expired claim between our check and the rename: give it back
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        return self._create(path)
+
+    def claim(self, task_id: str) -> bool:
+        """Claim a task. Returns False if another live process holds it or completed it."""
+        path = self._path(task_id)
+        claimed = self._create(path) or (self._is_expired(path) and self._take_over(path))
+        if claimed:
+            with self._lock:
+                self._held[task_id] = path
+            self._start_heartbeat()
+        return claimed
+
+    def complete(self, task_id: str) -> None:
+        """Mark a claimed task as done, so its claim never expires."""
+        with self._lock:
+            path = self._held.pop(task_id, None)
+        if path is None:
+            return
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**self.owner, "completed_at": time.time(), "done": True}, f)
+        os.replace(tmp, path)
+
+    def release(self, task_id: str) -> None:
+        """Give up a claimed task, so another process can run it right away."""
+        with self._lock:
+            path = self._held.pop(task_id, None)
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _start_heartbeat(self) -> None:
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._refresh, name="gaia-claims-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _refresh(self) -> None:
+        while True:
+            time.sleep(self.lease / 3)
+            with self._lock:
+                paths = list(self._held.values())
+            for path in paths:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
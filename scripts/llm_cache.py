@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+CACHE_MODES = ("read_write", "record", "replay", "off")
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _key_default(obj: Any) -> Any:
+    """Stable JSON stand-in for the non-JSON values found in completion kwargs."""
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": hashlib.sha256(obj).hexdigest()}
+    # PIL images, hashed by content rather than by their repr, which holds a memory address
+    if hasattr(obj, "tobytes") and hasattr(obj, "mode") and hasattr(obj, "size"):
+        digest = hashlib.sha256(f"{obj.mode}{tuple(obj.size)}".encode("utf-8"))
+        digest.update(obj.tobytes())
+        return {"__image__": digest.hexdigest()}
+    # Tools, identified by their schema
+    if hasattr(obj, "name") and hasattr(obj, "inputs"):
+        return {
+            "__tool__": obj.name,
+            "description": getattr(obj, "description", None),
+            "inputs": obj.inputs,
+            "output_type": getattr(obj, "output_type", None),
+        }
+    raise TypeError(f"Cannot build a cache key from {type(obj).__name__}")
+
+
+def cache_key(completion_kwargs: Dict[str, Any]) -> str:
+    """Hash everything that determines a completion: model id, messages, tools, stop sequences and sampling params.
+
+    Raises TypeError if the request holds a value with no stable serialization: such requests can't be cached.
+    """
+    payload = json.dumps(completion_kwargs, sort_keys=True, default=_key_default, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """An on-disk SQLite cache of chat completion responses.
+
+    Parameters:
+        path (`str`):
+            Path of the SQLite database file.
+        mode (`str`, *optional*, defaults to "read_write"):
+            - "read_write": return cached responses when present, store new ones.
+            - "record": always call the provider and overwrite the stored response.
+            - "replay": only serve stored responses, raise `CacheMissError` on a miss. Useful to re-run benchmarks offline.
+            - "off": bypass the cache entirely.
+        ttl (`float`, *optional*):
+            Entries older than this many seconds are ignored and overwritten. Never expire if None.
+        max_entries (`int`, *optional*):
+            When exceeded, the least recently used entries are evicted. Unbounded if None.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "read_write",
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = 100_000,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}.")
+        self.path = path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_eviction = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model_id TEXT, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Build a cache from LLM_CACHE_PATH, LLM_CACHE_MODE and LLM_CACHE_TTL, or return None if LLM_CACHE_PATH is unset."""
+        path = os.getenv("LLM_CACHE_PATH")
+        if not path:
+            return None
+        ttl = os.getenv("LLM_CACHE_TTL")
+        return cls(path, mode=os.getenv("LLM_CACHE_MODE", "read_write"), ttl=float(ttl) if ttl else None)
+
+    @property
+    def reads(self) -> bool:
+        return self.mode in ("read_write", "replay")
+
+    @property
+    def writes(self) -> bool:
+        return self.mode in ("read_write", "record")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.reads:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.ttl is None or now - row[1] <= self.ttl):
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+        if self.mode == "replay":
+            raise CacheMissError(f"No recorded response for request {key} in {self.path}")
+        return None
+
+    def put(self, key: str, response: Dict[str, Any], model_id: Optional[str] = None) -> None:
+        if not self.writes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model_id, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model_id, json.dumps(response), now, now),
+            )
+            self._puts_since_eviction += 1
+            # Evicting scans the table, so only do it every 100 writes
+            if self.max_entries is not None and self._puts_since_eviction >= 100:
+                self._puts_since_eviction = 0
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def prune(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,223 @@
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from .rate_limiter import message_usage
+
+
+# USD per million tokens: (prompt, cached prompt, completion). Matched on the longest model id prefix.
+MODEL_PRICES = {
+    "o1": (15.0, 7.5, 60.0),
+    "o3-mini": (1.1, 0.55, 4.4),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+    "gpt-4o": (2.5, 1.25, 10.0),
+    "claude-3-5-sonnet": (3.0, 0.3, 15.0),
+    "claude-3-7-sonnet": (3.0, 0.3, 15.0),
+    "claude-3-5-haiku": (0.8, 0.08, 4.0),
+    "gemini-2.0-flash": (0.1, 0.025, 0.4),
+}
+
+_call_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("llm_call_context", default={})
+
+
+@contextlib.contextmanager
+def call_context(**labels: Any) -> Iterator[None]:
+    """Attach labels (task_id, agent, tool, ...) to every LLM call made inside the block, including nested ones."""
+    token = _call_context.set({**_call_context.get(), **{k: str(v) for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_call_context() -> Dict[str, str]:
+    return dict(_call_context.get())
+
+
+def estimate_cost(model_id: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Cost in USD of a call, or 0 for models without a known price."""
+    model_name = model_id.split("/")[-1]
+    matches = [name for name in MODEL_PRICES if model_name.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, cached_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    uncached_tokens = max(prompt_tokens - cached_tokens, 0)
+    return (uncached_tokens * prompt_price + cached_tokens * cached_price + completion_tokens * completion_price) / 1e6
+
+
+@dataclass
+class CallRecord:
+    model_id: str
+    latency: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    time_to_first_token: Optional[float] = None
+    cost: float = 0.0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+def _aggregate(records: List[CallRecord]) -> Dict[str, Any]:
+    return {
+        "calls": len(records),
+        "errors": sum(r.error is not None for r in records),
+        "cache_hits": sum(r.cache_hit for r in records),
+        "prompt_tokens": sum(r.prompt_tokens for r in records),
+        "completion_tokens": sum(r.completion_tokens for r in records),
+        "cached_tokens": sum(r.cached_tokens for r in records),
+        "latency": round(sum(r.latency for r in records), 3),
+        "cost": round(sum(r.cost for r in records), 6),
+    }
+
+
+class MetricsRecorder:
+    """Thread-safe store of every LLM call made by the process."""
+
+    def __init__(self):
+        self._records: List[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        model_id: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        time_to_first_token: Optional[float] = None,
+        cache_hit: bool = False,
+        error: Optional[str] = None,
+        **labels: Any,
+    ) -> CallRecord:
+        record = CallRecord(
+            model_id=model_id,
+            latency=latency,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            time_to_first_token=time_to_first_token,
+            # Responses served from the local response cache cost nothing
+            cost=0.0 if cache_hit else estimate_cost(model_id, prompt_tokens, completion_tokens, cached_tokens),
+            cache_hit=cache_hit,
+            error=error,
+            labels={**current_call_context(), **{k: str(v) for k, v in labels.items() if v is not None}},
+        )
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def records(self, **label_filters: str) -> List[CallRecord]:
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if all(r.labels.get(k) == str(v) for k, v in label_filters.items())]
+
+    def summary(self, **label_filters: str) -> Dict[str, Any]:
+        """Aggregate calls matching the label filters, e.g. `summary(task_id="...")`."""
+        return _aggregate(self.records(**label_filters))
+
+    def summary_by(self, label: str) -> Dict[str, Dict[str, Any]]:
+        """Aggregate calls per value of a label, e.g. `summary_by("tool")`. Unlabelled calls are grouped under ""."""
+        groups: Dict[str, List[CallRecord]] = defaultdict(list)
+        for record in self.records():
+            groups[record.labels.get(label, "")].append(record)
+        return {value: _aggregate(records) for value, records in groups.items()}
+
+    def export_jsonl(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            for record in self.records():
+                fh.write(json.dumps(asdict(record)) + "\n")
+
+    def to_prometheus(self) -> str:
+        """Render the totals in the Prometheus text exposition format, labelled by model, agent and tool."""
+        totals: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for r in self.records():
+            key = (r.model_id, r.labels.get("agent", ""), r.labels.get("tool", ""))
+            totals[key]["calls"] += 1
+            totals[key]["errors"] += r.error is not None
+            totals[key]["prompt"] += r.prompt_tokens
+            totals[key]["completion"] += r.completion_tokens
+            totals[key]["cached"] += r.cached_tokens
+            totals[key]["latency"] += r.latency
+            totals[key]["cost"] += r.cost
+
+        lines = [
+            "# TYPE llm_calls_total counter",
+            "# TYPE llm_errors_total counter",
+            "# TYPE llm_tokens_total counter",
+            "# TYPE llm_latency_seconds_sum counter",
+            "# TYPE llm_cost_usd_total counter",
+        ]
+        for (model_id, agent, tool), values in sorted(totals.items()):
+            labels = f'model="{model_id}",agent="{agent}",tool="{tool}"'
+            lines.append(f"llm_calls_total{{{labels}}} {values['calls']:g}")
+            lines.append(f"llm_errors_total{{{labels}}} {values['errors']:g}")
+            for token_type in ("prompt", "completion", "cached"):
+                lines.append(f'llm_tokens_total{{{labels},type="{token_type}"}} {values[token_type]:g}')
+            lines.append(f"llm_latency_seconds_sum{{{labels}}} {values['latency']:.3f}")
+            lines.append(f"llm_cost_usd_total{{{labels}}} {values['cost']:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """Return the process-wide MetricsRecorder."""
+    return _recorder
+
+
+class InstrumentedModel:
+    """Wraps a smolagents model to label its calls and record them in the process-wide MetricsRecorder.
+
+    Models that record their own calls (`records_metrics = True`, like PortkeyModel) are only labelled,
+    so a call is never counted twice.
+
+    Args:
+        model: The wrapped model.
+        **labels: Labels attached to every call, e.g. agent="search_agent".
+    """
+
+    def __init__(self, model, **labels: Any):
+        self.model = model
+        self.labels = labels
+
+    @property
+    def records_metrics(self) -> bool:
+        return True
+
+    def __call__(self, *args, **kwargs):
+        with call_context(**self.labels):
+            if getattr(self.model, "records_metrics", False):
+                return self.model(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                message = self.model(*args, **kwargs)
+            except Exception as e:
+                get_recorder().record(str(self.model.model_id), time.perf_counter() - start_time, error=repr(e))
+                raise
+            # Read from the message rather than the model, whose counters other threads may have overwritten
+            prompt_tokens, completion_tokens = message_usage(message) or (0, 0)
+            get_recorder().record(
+                str(self.model.model_id),
+                time.perf_counter() - start_time,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+            return message
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
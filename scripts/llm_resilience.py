@@ -0,0 +1,130 @@
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class RetryPolicy:
+    """How transient provider errors are retried.
+
+    Delays use "full jitter" exponential backoff: a random delay between 0 and
+    min(max_delay, base_delay * 2**attempt), but never less than the server's Retry-After.
+    """
+
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    retry_statuses: tuple = (408, 409, 429, 500, 502, 503, 504, 529)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitOpenError(Exception):
+    """Raised when every route to a provider is short-circuited after repeated failures."""
+
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def get_retry_after(error: Optional[BaseException]) -> Optional[float]:
+    """Read the Retry-After header (seconds or HTTP date) from an API error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException, policy: RetryPolicy) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = get_status_code(error)
+    if status is not None:
+        return status in policy.retry_statuses
+    name = type(error).__name__.lower()
+    return "timeout" in name or "connection" in name or isinstance(error, (TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Stops sending requests to a failing route for `reset_timeout` seconds.
+
+    After `failure_threshold` consecutive failures the circuit opens. Once `reset_timeout` has passed,
+    a single trial request is let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """End a request that says nothing about the route's health (e.g. a bad request), leaving the counts as is."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a route (e.g. a Portkey virtual key)."""
+    with _circuit_breakers_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker()
+        return _circuit_breakers[name]
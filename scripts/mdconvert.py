@@ -33,6 +33,8 @@ from bs4 import BeautifulSoup
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import SRTFormatter
 
+from .tracing import traced
+
 
 class _CustomMarkdownify(markdownify.MarkdownConverter):
     """
@@ -924,6 +926,7 @@ class MarkdownConverter:
 
         return result
 
+    @traced("MarkdownConverter._convert")
     def _convert(self, local_path: str, extensions: List[Union[str, None]], **kwargs) -> DocumentConverterResult:
         error_trace = ""
         for ext in extensions + [None]:  # Try last with no extension
@@ -1,69 +1,73 @@
 import os
+import time
+from functools import lru_cache
+
 from dotenv import load_dotenv
 from portkey_ai import Portkey
 
+from .llm_metrics import get_recorder
+
 # Load environment variables
 load_dotenv()
 
-# Initialize Portkey clients
-portkey_anthropic = Portkey(
-    api_key=os.getenv("PORTKEY_API_KEY"),
-    virtual_key=os.getenv("PORTKEY_VIRTUAL_KEY_ANTHROPIC")
-)
+VIRTUAL_KEY_ENV_VARS = {
+    "anthropic": "PORTKEY_VIRTUAL_KEY_ANTHROPIC",
+    "openai": "PORTKEY_VIRTUAL_KEY_OPENAI",
+    "google": "PORTKEY_VIRTUAL_KEY_GOOGLE",
+}
 
-portkey_openai = Portkey(
-    api_key=os.getenv("PORTKEY_API_KEY"),
-    virtual_key=os.getenv("PORTKEY_VIRTUAL_KEY_OPENAI")
-)
 
-portkey_google = Portkey(
-    api_key=os.getenv("PORTKEY_API_KEY"),
-    virtual_key=os.getenv("PORTKEY_VIRTUAL_KEY_GOOGLE")
-)
+@lru_cache(maxsize=None)
+def get_client(provider: str) -> Portkey:
+    """Return the shared Portkey client for a provider, created on first use."""
+    return Portkey(
+        api_key=os.getenv("PORTKEY_API_KEY"),
+        virtual_key=os.getenv(VIRTUAL_KEY_ENV_VARS[provider])
+    )
 
-def claude35sonnet(prompt):
-    """Wrapper function for Claude 3.5 Sonnet"""
-    completion = portkey_anthropic.chat.completions.create(
+
+def _record_usage(model: str, completion, start_time: float) -> None:
+    usage = completion.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    get_recorder().record(
+        model,
+        time.perf_counter() - start_time,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+    )
+
+
+def _complete(provider: str, model: str, prompt: str, **kwargs) -> str:
+    start_time = time.perf_counter()
+    completion = get_client(provider).chat.completions.create(
         messages=[{"role": "user", "content": prompt}],
-        model="claude-3-5-sonnet-latest",
-        max_tokens=8192
+        model=model,
+        **kwargs
     )
+    _record_usage(model, completion, start_time)
     return completion.choices[0].message.content
 
+
+def claude35sonnet(prompt):
+    """Wrapper function for Claude 3.5 Sonnet"""
+    return _complete("anthropic", "claude-3-5-sonnet-latest", prompt, max_tokens=8192)
+
 def gpt4o(prompt):
     """Wrapper function for GPT-4"""
-    completion = portkey_openai.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gpt-4o",
-        max_tokens=8192
-    )
-    return completion.choices[0].message.content
+    return _complete("openai", "gpt-4o", prompt, max_tokens=8192)
 
 def gemini2pro(prompt):
     """Wrapper function for Gemini 2 Pro"""
-    completion = portkey_google.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gemini-2.0-pro-exp-02-05",
-        max_tokens=8192
-    )
-    return completion.choices[0].message.content
+    return _complete("google", "gemini-2.0-pro-exp-02-05", prompt, max_tokens=8192)
 
 def gemini2flashthinking(prompt):
     """Wrapper function for Gemini 2 Flash Thinking"""
-    completion = portkey_google.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gemini-2.0-flash-thinking-exp-01-21",
-        max_tokens=8192
-    )
-    return completion.choices[0].message.content
+    return _complete("google", "gemini-2.0-flash-thinking-exp-01-21", prompt, max_tokens=8192)
 
 def o3minihigh(prompt):
     """Wrapper function for o3-mini-high model"""
-    completion = portkey_openai.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="o3-mini-2025-01-31"
-    )
-    return completion.choices[0].message.content
+    return _complete("openai", "o3-mini-2025-01-31", prompt)
 
 def test():
     # Test Claude 3.5 Sonnet
@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .text_retrieval import estimate_tokens
+
+
+class RateLimiter:
+    """Process-wide budget of requests per minute, tokens per minute and in-flight requests for one model.
+
+    Callers are served strictly in arrival order, so concurrent tasks share the quota fairly instead of
+    racing for it. Token usage is reserved from an estimate when a call starts and reconciled with the
+    actual usage reported by the provider when it ends.
+
+    Parameters:
+        requests_per_minute (`float`, *optional*): Request budget. Unlimited if None.
+        tokens_per_minute (`float`, *optional*): Prompt + completion token budget. Unlimited if None.
+        max_concurrency (`int`, *optional*): Maximum number of calls in flight. Unlimited if None.
+    """
+
+    ASYNC_POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        # Buckets start full, so the first minute can burst up to the budget
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._queue: deque = deque()
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait_time = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                self.requests_per_minute, self._request_allowance + elapsed_minutes * self.requests_per_minute
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                self.tokens_per_minute, self._token_allowance + elapsed_minutes * self.tokens_per_minute
+            )
+
+    def _wait_time(self, estimated_tokens: int) -> Optional[float]:
+        """Seconds until a call of `estimated_tokens` fits the budgets, 0 if it fits now, None if blocked on concurrency."""
+        if self.max_concurrency is not None and self._in_flight >= self.max_concurrency:
+            return None
+        wait = 0.0
+        if self.requests_per_minute and self._request_allowance < 1:
+            wait = max(wait, (1 - self._request_allowance) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            # A single call larger than the whole budget is let through once the bucket is full
+            needed = min(estimated_tokens, self.tokens_per_minute)
+            if self._token_allowance < needed:
+                wait = max(wait, (needed - self._token_allowance) * 60 / self.tokens_per_minute)
+        return wait
+
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        """Block until it is this caller's turn and the budgets allow the call."""
+        start = time.monotonic()
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] == ticket:
+                        wait = self._wait_time(estimated_tokens)
+                        if wait == 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(timeout=wait)
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+            self._take(estimated_tokens, start)
+
+    async def aacquire(self, estimated_tokens: int = 0) -> None:
+        """Async version of `acquire`, polling from the event loop so it stays free.
+
+        Waiting happens in `asyncio.sleep` without holding anything, so a task cancelled while queued just
+        leaves the queue: no slot is taken on its behalf.
+        """
+        start = time.monotonic()
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    self._refill()
+                    wait = self._wait_time(estimated_tokens) if self._queue[0] == ticket else None
+                    if wait == 0:
+                        self._take(estimated_tokens, start)
+                        return
+                # Threads releasing slots notify the condition, which the loop can't wait on: poll instead
+                await asyncio.sleep(self.ASYNC_POLL_INTERVAL if wait is None else min(wait, self.ASYNC_POLL_INTERVAL))
+        finally:
+            with self._condition:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+    def _take(self, estimated_tokens: int, start: float) -> None:
+        if self.requests_per_minute:
+            self._request_allowance -= 1
+        if self.tokens_per_minute:
+            self._token_allowance -= estimated_tokens
+        self._in_flight += 1
+        self.total_wait_time += time.monotonic() - start
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None) -> None:
+        """End a call, correcting the token budget with the actual usage when known."""
+        with self._condition:
+            self._in_flight -= 1
+            self.total_requests += 1
+            if actual_tokens is not None:
+                self.total_tokens += actual_tokens
+                if self.tokens_per_minute:
+                    self._token_allowance -= actual_tokens - estimated_tokens
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            self._refill()
+            return {
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "total_requests": self.total_requests,
+                "total_tokens": self.total_tokens,
+                "total_wait_time": round(self.total_wait_time, 3),
+                "request_allowance": round(self._request_allowance, 2),
+                "token_allowance": round(self._token_allowance),
+            }
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(
+    model_id: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+) -> RateLimiter:
+    """Set the process-wide budgets of a model and return its limiter."""
+    with _rate_limiters_lock:
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_concurrency)
+        _rate_limiters[model_id] = limiter
+        return limiter
+
+
+def get_rate_limiter(model_id: str) -> Optional[RateLimiter]:
+    """Return the process-wide limiter of a model.
+
+    If none was configured, one is built from the LLM_RPM, LLM_TPM and LLM_MAX_CONCURRENCY env vars.
+    Returns None when no budget is set at all.
+    """
+    with _rate_limiters_lock:
+        if model_id not in _rate_limiters:
+            rpm, tpm, concurrency = (os.getenv(name) for name in ("LLM_RPM", "LLM_TPM", "LLM_MAX_CONCURRENCY"))
+            if not (rpm or tpm or concurrency):
+                return None
+            _rate_limiters[model_id] = RateLimiter(
+                float(rpm) if rpm else None, float(tpm) if tpm else None, int(concurrency) if concurrency else None
+            )
+        return _rate_limiters[model_id]
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth and usage of every limiter, keyed by model id."""
+    with _rate_limiters_lock:
+        limiters = dict(_rate_limiters)
+    return {model_id: limiter.stats() for model_id, limiter in limiters.items()}
+
+
+def estimate_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    return estimate_tokens(json.dumps(messages, default=str))
+
+
+def message_usage(message: Any) -> Optional[Tuple[int, int]]:
+    """Prompt and completion tokens of the call that returned `message`, read from its raw response.
+
+    Unlike the model's `last_*_token_count` attributes, this stays correct when other threads use the same
+    model concurrently. Returns None when the raw response carries no usage.
+    """
+    raw = getattr(message, "raw", None)
+    if isinstance(raw, list):
+        # Streamed completion: the usage comes with the last chunks
+        raw = next((chunk for chunk in reversed(raw) if getattr(chunk, "usage", None) is not None), None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def message_token_usage(message: Any) -> Optional[int]:
+    """Prompt + completion tokens of the call that returned `message`, or None if unknown (see `message_usage`)."""
+    usage = message_usage(message)
+    return sum(usage) if usage is not None else None
+
+
+class RateLimitedModel:
+    """Wraps any smolagents model so that its calls go through a RateLimiter.
+
+    The actual usage of a call is read from the message it returns (see `message_token_usage`). Other
+    attributes (model_id, last_input_token_count, ...) are read from the wrapped model.
+    """
+
+    def __init__(self, model, rate_limiter: Optional[RateLimiter] = None):
+        self.model = model
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(model.model_id)
+
+    def __call__(self, messages: List[Dict[str, Any]], *args, **kwargs):
+        if self.rate_limiter is None:
+            return self.model(messages, *args, **kwargs)
+        estimated_tokens = estimate_message_tokens(messages)
+        self.rate_limiter.acquire(estimated_tokens)
+        actual_tokens = None
+        try:
+            message = self.model(messages, *args, **kwargs)
+            actual_tokens = message_token_usage(message)
+            return message
+        finally:
+            self.rate_limiter.release(estimated_tokens, actual_tokens)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
@@ -0,0 +1,137 @@
+"""Inspect and prune the deep-research memo written by src/research-cache.ts.
+
+    python -m scripts.research_cache stats
+    python -m scripts.research_cache list --namespace search
+    python -m scripts.research_cache prune [--ttl SECONDS]
+    python -m scripts.research_cache clear [--namespace learnings]
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def default_cache_dir() -> str:
+    """RESEARCH_CACHE_DIR, resolved like the TS engine does from the repository root."""
+    path = os.getenv("RESEARCH_CACHE_DIR") or ".research-cache"
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return path if os.path.isabs(path) else os.path.join(repo_root, path)
+
+
+@dataclass
+class ResearchCacheEntry:
+    namespace: str
+    path: str
+    key: Any
+    created_at: float
+    size: int
+
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+
+class ResearchCache:
+    """View of the on-disk research memo: one JSON file per entry, grouped in a directory per namespace.
+
+    Parameters:
+        path (`str`, *optional*): Cache directory. Defaults to RESEARCH_CACHE_DIR or `.research-cache`.
+        ttl (`float`, *optional*): Entries older than this many seconds are expired.
+            Defaults to RESEARCH_CACHE_TTL or 7 days, like the TS engine.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path or default_cache_dir()
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESEARCH_CACHE_TTL") or DEFAULT_TTL)
+
+    def namespaces(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name)))
+
+    def entries(self, namespace: Optional[str] = None) -> Iterator[ResearchCacheEntry]:
+        for name in [namespace] if namespace else self.namespaces():
+            directory = os.path.join(self.path, name)
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        entry = json.load(f)
+                    created_at = entry["createdAt"] / 1000
+                    key = entry.get("key")
+                except (OSError, ValueError, KeyError):
+                    # Unreadable entries are treated as infinitely old, so prune removes them
+                    created_at, key = 0.0, None
+                yield ResearchCacheEntry(name, path, key, created_at, os.path.getsize(path))
+
+    def is_expired(self, entry: ResearchCacheEntry) -> bool:
+        return entry.age() > self.ttl
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Number of entries, expired entries and bytes per namespace."""
+        stats = {}
+        for namespace in self.namespaces():
+            entries = list(self.entries(namespace))
+            stats[namespace] = {
+                "entries": len(entries),
+                "expired": sum(self.is_expired(entry) for entry in entries),
+                "bytes": sum(entry.size for entry in entries),
+            }
+        return stats
+
+    def prune(self) -> int:
+        """Delete expired and unreadable entries, and leftover temporary files. Returns how many entries were removed."""
+        removed = 0
+        for entry in self.entries():
+            if self.is_expired(entry):
+                os.remove(entry.path)
+                removed += 1
+        for namespace in self.namespaces():
+            directory = os.path.join(self.path, namespace)
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                # Temporary files of writes interrupted more than an hour ago
+                if filename.endswith(".tmp") and time.time() - os.path.getmtime(path) > 3600:
+                    os.remove(path)
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        removed = 0
+        for entry in self.entries(namespace):
+            os.remove(entry.path)
+            removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the deep-research cache.")
+    parser.add_argument("command", choices=["stats", "list", "prune", "clear"])
+    parser.add_argument("--path", type=str, default=None, help="Cache directory (default: RESEARCH_CACHE_DIR)")
+    parser.add_argument("--ttl", type=float, default=None, help="Expiry in seconds (default: RESEARCH_CACHE_TTL)")
+    parser.add_argument("--namespace", type=str, default=None, help="search, serp-queries or learnings")
+    args = parser.parse_args()
+
+    cache = ResearchCache(args.path, args.ttl)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "list":
+        for entry in cache.entries(args.namespace):
+            status = "expired" if cache.is_expired(entry) else "fresh"
+            print(f"{entry.namespace}\t{entry.age() / 3600:.1f}h\t{status}\t{json.dumps(entry.key)[:120]}")
+    elif args.command == "prune":
+        print(f"Removed {cache.prune()} expired entries from {cache.path}")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear(args.namespace)} entries from {cache.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import atexit
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+DEFAULT_COMMAND = ["tsx", "--env-file=.env", "src/worker.ts"]
+
+# Called with the method and params of each notification the worker sends about a request
+NotificationCallback = Callable[[str, Dict[str, Any]], None]
+
+
+@dataclass
+class ResearchBudget:
+    """Limits of one research job, enforced by the TS engine (src/research-budget.ts).
+
+    Once a limit is reached the research starts no new query and goes no deeper, and the report is
+    written from the learnings gathered so far. Unset limits are not enforced.
+    """
+
+    deadline_s: Optional[float] = None
+    max_llm_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_pages: Optional[int] = None
+
+    def to_params(self) -> Dict[str, Any]:
+        """JSON-RPC params of the worker's research method."""
+        params = {
+            "deadlineS": self.deadline_s,
+            "maxLlmCalls": self.max_llm_calls,
+            "maxTokens": self.max_tokens,
+            "maxPages": self.max_pages,
+        }
+        return {name: value for name, value in params.items() if value is not None}
+
+    def to_cli_args(self) -> List[str]:
+        """Options of src/run.ts."""
+        args = []
+        for name, value in self.to_params().items():
+            option = "--" + "".join(f"-{c.lower()}" if c.isupper() else c for c in name)
+            args += [option, str(value)]
+        return args
+
+
+class ResearchWorkerError(RuntimeError):
+    """Raised when the research worker fails a request or exits while requests are pending."""
+
+
+class ResearchWorker:
+    """Client of a long-lived `src/worker.ts` process, so research calls skip Node startup and module init.
+
+    Requests are sent as JSON-RPC over the worker's stdin and may run concurrently; a reader thread
+    resolves the matching futures as responses arrive on its stdout. The worker is (re)started on demand,
+    so a crash only fails the requests that were in flight.
+
+    Parameters:
+        command (`List[str]`, *optional*): Command starting the worker. Defaults to `tsx src/worker.ts`.
+        env (`Dict[str, str]`, *optional*): Environment of the worker process.
+        cwd (`str`, *optional*): Working directory of the worker process, the repository root by default.
+    """
+
+    def __init__(
+        self,
+        command: Optional[List[str]] = None,
+        env: Optional[Dict[str, str]] = None,
+        cwd: Optional[str] = None,
+    ):
+        self.command = command or DEFAULT_COMMAND
+        self.env = {**(env if env is not None else os.environ), "RESEARCH_WORKER": "1"}
+        self.cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._process: Optional[subprocess.Popen] = None
+        self._pending: Dict[int, Future] = {}
+        self._notification_callbacks: Dict[int, NotificationCallback] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if not self.running:
+            # Each process gets its own pending tables, so a dying worker only fails its own requests
+            self._pending = {}
+            self._notification_callbacks = {}
+            # Worker logs go to our stderr, stdout only carries the protocol
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=self.env,
+                cwd=self.cwd,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+            )
+            threading.Thread(
+                target=self._read_responses,
+                args=(self._process, self._pending, self._notification_callbacks),
+                name="research-worker-reader",
+                daemon=True,
+            ).start()
+        return self._process
+
+    def _read_responses(
+        self,
+        process: subprocess.Popen,
+        pending: Dict[int, Future],
+        notification_callbacks: Dict[int, NotificationCallback],
+    ) -> None:
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "method" in message:
+                params = message.get("params", {})
+                callback = notification_callbacks.get(params.get("id"))
+                if callback is not None:
+                    try:
+                        callback(message["method"], params)
+                    except Exception:
+                        # A broken callback must not kill the thread every pending request depends on
+                        print(f"Notification callback for request {params.get('id')} failed:", file=sys.stderr)
+                        traceback.print_exc()
+            elif message.get("id") is not None:
+                with self._lock:
+                    future = pending.pop(message["id"], None)
+                    notification_callbacks.pop(message["id"], None)
+                if future is None:
+                    continue
+                if "error" in message:
+                    error = message["error"]
+                    future.set_exception(ResearchWorkerError(f"{error.get('message')} (code {error.get('code')})"))
+                else:
+                    future.set_result(message.get("result"))
+
+        # The worker exited: fail whatever it was still working on
+        return_code = process.wait()
+        with self._lock:
+            if self._process is process:
+                self._process = None
+            failed = list(pending.values())
+            pending.clear()
+            notification_callbacks.clear()
+        for future in failed:
+            future.set_exception(ResearchWorkerError(f"Research worker exited with code {return_code}"))
+
+    def submit(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        on_notification: Optional[NotificationCallback] = None,
+    ) -> Future:
+        """Send a request and return a future resolved with its result. The request id is `future.request_id`."""
+        future: Future = Future()
+        with self._lock:
+            process = self._ensure_started()
+            request_id = next(self._ids)
+            future.request_id = request_id
+            self._pending[request_id] = future
+            if on_notification is not None:
+                self._notification_callbacks[request_id] = on_notification
+            try:
+                request = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+                process.stdin.write(json.dumps(request) + "\n")
+                process.stdin.flush()
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                self._notification_callbacks.pop(request_id, None)
+                raise ResearchWorkerError(f"Could not send request to the research worker: {e}") from e
+        return future
+
+    def research(
+        self,
+        query: str,
+        breadth: int = 4,
+        depth: int = 2,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        budget: Optional[ResearchBudget] = None,
+    ) -> Dict[str, Any]:
+        """Run a research job and return its report, learnings and visited URLs."""
+
+        def on_notification(method: str, params: Dict[str, Any]) -> None:
+            if method == "progress" and on_progress is not None:
+                on_progress(params.get("progress", {}))
+
+        params = {"query": query, "breadth": breadth, "depth": depth, **(budget.to_params() if budget else {})}
+        future = self.submit("research", params, on_notification)
+        return future.result(timeout=timeout)
+
+    def cancel(self, request_id: int) -> Future:
+        """Stop a research request early. It still completes, with a report of what it gathered so far."""
+        return self.submit("cancel", {"id": request_id})
+
+    def stream_research(
+        self,
+        query: str,
+        breadth: int = 4,
+        depth: int = 2,
+        max_learnings: Optional[int] = None,
+        deadline_s: Optional[float] = None,
+        budget: Optional[ResearchBudget] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Run a research job, yielding its learnings as they are extracted.
+
+        Yields `{"type": "learnings", "query", "learnings", "visited_urls"}` events, then a final
+        `{"type": "result", ...}` event with the report. The research is stopped early (and the report
+        written from what was gathered) once `max_learnings` learnings were yielded or `deadline_s` seconds
+        have passed, or if the caller stops iterating. Unlike `budget.deadline_s`, `deadline_s` includes the
+        time taken by the report.
+        """
+        events: queue.Queue = queue.Queue()
+
+        def on_notification(method: str, params: Dict[str, Any]) -> None:
+            if method == "learnings":
+                events.put(params)
+
+        params = {"query": query, "breadth": breadth, "depth": depth, "stream": True}
+        future = self.submit("research", {**params, **(budget.to_params() if budget else {})}, on_notification)
+        future.add_done_callback(lambda _: events.put(None))
+        deadline = time.monotonic() + deadline_s if deadline_s is not None else None
+        learning_count = 0
+        cancelled = False
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline is not None and not cancelled else None
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    # Deadline reached
+                    self.cancel(future.request_id)
+                    cancelled = True
+                    continue
+                if event is None:
+                    break
+                learning_count += len(event.get("learnings", []))
+                yield {
+                    "type": "learnings",
+                    "query": event.get("query"),
+                    "learnings": event.get("learnings", []),
+                    "visited_urls": event.get("visitedUrls", []),
+                }
+                if not cancelled and max_learnings is not None and learning_count >= max_learnings:
+                    self.cancel(future.request_id)
+                    cancelled = True
+            yield {"type": "result", **future.result()}
+        finally:
+            if not future.done() and not cancelled:
+                self.cancel(future.request_id)
+
+    def stats(self, timeout: Optional[float] = 10) -> Dict[str, Any]:
+        """Current limit, in-flight and queued operations of the worker's search and LLM limiters."""
+        return self.submit("stats").result(timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the worker. Requests still in flight fail with ResearchWorkerError."""
+        with self._lock:
+            process = self._process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+
+_research_worker: Optional[ResearchWorker] = None
+_research_worker_lock = threading.Lock()
+
+
+def get_research_worker(env: Optional[Dict[str, str]] = None) -> ResearchWorker:
+    """Return the process-wide research worker, creating it with `env` on first use."""
+    global _research_worker
+    with _research_worker_lock:
+        if _research_worker is None:
+            _research_worker = ResearchWorker(env=env)
+            atexit.register(_research_worker.close)
+        return _research_worker
@@ -1,12 +1,22 @@
+import contextvars
 import json
 import os
 import shutil
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 
 # import tqdm.asyncio
 from smolagents.utils import AgentError
 
+from .conversion_cache import LRUCache, file_content_hash
+
+
+# LLM descriptions of attached files, keyed by file content hash, question, kind of description and the model
+# writing it, so retried tasks and files repeated across archives or tasks are described once
+description_cache = LRUCache(max_entries=512)
+
 
 def serialize_agent_error(obj):
     if isinstance(obj, AgentError):
@@ -15,7 +25,33 @@ def serialize_agent_error(obj):
         return str(obj)
 
 
+def _describer_id(tool) -> str:
+    """Model behind an inspection tool, falling back to the tool's name for tools with a fixed model."""
+    model = getattr(tool, "model", None)
+    model_id = getattr(model, "model_id", None) or getattr(getattr(tool, "client", None), "model", None)
+    return model_id or getattr(tool, "name", type(tool).__name__)
+
+
+def _cached_description(kind: str, file_path: str, question: str, tool, describe: Callable[[], str]) -> str:
+    key = (kind, _describer_id(tool), file_content_hash(file_path), question)
+    description = description_cache.get(key)
+    if description is None:
+        description = describe()
+        description_cache.put(key, description)
+    return description
+
+
 def get_image_description(file_name: str, question: str, visual_inspection_tool) -> str:
+    return _cached_description(
+        "image",
+        file_name,
+        question,
+        visual_inspection_tool,
+        lambda: _describe_image(file_name, question, visual_inspection_tool),
+    )
+
+
+def _describe_image(file_name: str, question: str, visual_inspection_tool) -> str:
     prompt = f"""Write a caption of 5 sentences for this image. Pay special attention to any details that might be useful for someone answering the following question:
 {question}. But do not try to answer the question directly!
 Do not add any information that is not present in the image."""
@@ -23,6 +59,16 @@ Do not add any information that is not present in the image."""
 
 
 def get_document_description(file_path: str, question: str, document_inspection_tool) -> str:
+    return _cached_description(
+        "document",
+        file_path,
+        question,
+        document_inspection_tool,
+        lambda: _describe_document(file_path, question, document_inspection_tool),
+    )
+
+
+def _describe_document(file_path: str, question: str, document_inspection_tool) -> str:
     prompt = f"""Write a caption of 5 sentences for this document. Pay special attention to any details that might be useful for someone answering the following question:
 {question}. But do not try to answer the question directly!
 Do not add any information that is not present in the document."""
@@ -52,19 +98,57 @@ def get_single_file_description(file_path: str, question: str, visual_inspection
         return f" - Attached file: {file_path}"
 
 
-def get_zip_description(file_path: str, question: str, visual_inspection_tool, document_inspection_tool):
+def get_zip_description(
+    file_path: str,
+    question: str,
+    visual_inspection_tool,
+    document_inspection_tool,
+    max_workers: Optional[int] = None,
+):
+    """Describe every file of a zip archive. Files are described concurrently, by at most `max_workers` threads
+    (FILE_DESCRIPTION_CONCURRENCY, default 4), and files identical to an earlier one are only listed."""
     folder_path = file_path.replace(".zip", "")
     os.makedirs(folder_path, exist_ok=True)
     shutil.unpack_archive(file_path, folder_path)
 
-    prompt_use_files = ""
+    file_paths: List[str] = []
     for root, dirs, files in os.walk(folder_path):
         for file in files:
-            file_path = os.path.join(root, file)
-            prompt_use_files += "\n" + textwrap.indent(
-                get_single_file_description(file_path, question, visual_inspection_tool, document_inspection_tool),
-                prefix="    ",
+            file_paths.append(os.path.join(root, file))
+
+    # The first path of each distinct content, which gets the description
+    originals: Dict[str, str] = {}
+    duplicate_of: Dict[str, str] = {}
+    for path in file_paths:
+        original = originals.setdefault(file_content_hash(path), path)
+        if original != path:
+            duplicate_of[path] = original
+
+    to_describe = [path for path in file_paths if path not in duplicate_of]
+    if max_workers is None:
+        max_workers = int(os.getenv("FILE_DESCRIPTION_CONCURRENCY", "4"))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(to_describe) or 1))) as executor:
+        # Run each description in a copy of the caller's context, so its LLM calls keep the task's labels
+        futures = {
+            path: executor.submit(
+                contextvars.copy_context().run,
+                get_single_file_description,
+                path,
+                question,
+                visual_inspection_tool,
+                document_inspection_tool,
             )
+            for path in to_describe
+        }
+        descriptions = {path: future.result() for path, future in futures.items()}
+
+    prompt_use_files = ""
+    for path in file_paths:
+        if path in duplicate_of:
+            description = f" - Attached file: {path} (identical to {duplicate_of[path]})"
+        else:
+            description = descriptions[path]
+        prompt_use_files += "\n" + textwrap.indent(description, prefix="    ")
     return prompt_use_files
 
 
@@ -1,14 +1,121 @@
+import asyncio
+import copy
 import os
+import threading
+import time
+import weakref
 from dataclasses import dataclass
-from portkey_ai import Portkey
-from typing import Dict, List, Optional
+from portkey_ai import AsyncPortkey, Portkey
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from smolagents.models import Model, ChatMessage, Tool, parse_tool_args_if_needed
 
+from .llm_cache import CacheMissError, ResponseCache, cache_key
+from .llm_metrics import get_recorder
+from .rate_limiter import RateLimiter, estimate_message_tokens, get_rate_limiter
+from .text_retrieval import estimate_tokens
+from .llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_circuit_breaker,
+    get_retry_after,
+    is_retryable,
+)
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return a process-wide event loop running in a daemon thread.
+
+    Synchronous code submits coroutines to it, so async clients and their connection pools live across calls.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="portkey-async-loop", daemon=True).start()
+        return _background_loop
+
+
+def virtual_key_for_model(model_id: str) -> Optional[str]:
+    """Return the Portkey virtual key of the provider serving `model_id`, read from the environment."""
+    if "claude" in model_id.lower():
+        return os.getenv("PORTKEY_VIRTUAL_KEY_ANTHROPIC")
+    elif "gemini" in model_id.lower():
+        return os.getenv("PORTKEY_VIRTUAL_KEY_GOOGLE")
+    else:
+        return os.getenv("PORTKEY_VIRTUAL_KEY_OPENAI")
+
+
+def usage_to_dict(usage) -> Dict[str, int]:
+    """Token usage of a completion, including the prompt tokens served from the provider's prompt cache."""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    # OpenAI reports cache reads in prompt_tokens_details, Anthropic in cache_read_input_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": cached_tokens,
+    }
+
+
+def mark_cache_breakpoints(messages: List[Dict]) -> List[Dict]:
+    """Return a copy of `messages` with Anthropic `cache_control` breakpoints on the stable prefix.
+
+    Two breakpoints are set: at the end of the system prompt, which never changes during a run, and at
+    the end of the last message, so that the next step can reuse everything up to it from the cache.
+    """
+    messages = copy.deepcopy(messages)
+    breakpoints = [message for message in messages[:1] if message["role"] == "system"] + messages[-1:]
+    for message in breakpoints:
+        content = message.get("content")
+        if isinstance(content, str):
+            message["content"] = [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
+        elif isinstance(content, list):
+            text_blocks = [block for block in content if isinstance(block, dict) and block.get("type") == "text"]
+            if text_blocks:
+                text_blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return messages
+
+
+@dataclass
+class _Route:
+    """A model id served through one virtual key, with its own clients and circuit breaker."""
+
+    model_id: str
+    client: Portkey
+    client_kwargs: Dict[str, Any]
+    breaker: CircuitBreaker
+    # Whether requests to this model get Anthropic cache_control breakpoints
+    prompt_caching: bool = False
+
+    def __post_init__(self):
+        # Async clients hold a connection pool bound to an event loop, so keep one per loop
+        self.async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncPortkey]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get_async_client(self) -> AsyncPortkey:
+        loop = asyncio.get_running_loop()
+        client = self.async_clients.get(loop)
+        if client is None:
+            client = AsyncPortkey(**self.client_kwargs)
+            self.async_clients[loop] = client
+        return client
+
 
 class PortkeyModel(Model):
     """This model connects to Portkey.ai as a gateway to multiple LLM providers.
 
+    Every call is recorded (latency, time to first token, prompt/completion/cached tokens, cost) in the
+    process-wide `MetricsRecorder` of `scripts.llm_metrics`, labelled with the active `call_context`.
+
     Parameters:
         model_id (`str`):
             The model identifier to use (e.g. "claude-3-5-sonnet-latest", "gpt-4o", "gemini-2.0-pro-exp-02-05").
@@ -16,36 +123,156 @@ class PortkeyModel(Model):
             The Portkey API key. If not provided, will try to read from PORTKEY_API_KEY env var.
         virtual_key (`str`, *optional*): 
             The Portkey virtual key for the specific provider. If not provided, will try to read from env var.
+        cache (`ResponseCache`, *optional*):
+            Cache of responses keyed by model id, messages, tools and sampling params.
+            If not provided, one is built from the LLM_CACHE_PATH / LLM_CACHE_MODE / LLM_CACHE_TTL env vars, if set.
+        stream (`bool`, *optional*, defaults to False):
+            Consume the completion as server-sent deltas instead of waiting for the full response.
+            The time to first token of the last call is then available as `last_time_to_first_token`,
+            and generation is cut as soon as one of the stop sequences appears.
+        on_delta (`Callable[[str], None]`, *optional*):
+            Called with each content delta in streaming mode, e.g. to display tokens or start parsing early.
+        retry_policy (`RetryPolicy`, *optional*):
+            How rate limits (429), server errors (5xx), timeouts and connection errors are retried.
+            Defaults to `RetryPolicy()`: up to 5 retries with jittered exponential backoff honoring Retry-After.
+        fallback_model_ids (`List[str]`, *optional*):
+            Models to fail over to, in order, when the primary model keeps failing or its circuit is open,
+            e.g. ["gpt-4o", "claude-3-5-sonnet-latest"]. Their virtual keys are read from the environment.
+            Defaults to the comma-separated PORTKEY_FALLBACK_MODELS env var.
+        prompt_caching (`bool`, *optional*):
+            Mark the stable prompt prefix (system prompt and conversation so far) as cacheable with Anthropic
+            `cache_control` breakpoints. Defaults to True for Claude models. Fallback routes only get them if
+            they are Claude models too. OpenAI models cache long prefixes automatically. The cached prompt tokens of the last call are available as `last_cached_input_token_count`.
+        rate_limiter (`RateLimiter`, *optional*):
+            Process-wide requests/tokens per minute budget shared by every caller of this model.
+            Defaults to `get_rate_limiter(model_id)`, configured with `configure_rate_limit` or the LLM_RPM / LLM_TPM env vars.
         **kwargs:
             Additional keyword arguments to pass to the Portkey API.
     """
 
+    records_metrics = True
+
     def __init__(
         self,
         model_id: str,
         api_key: Optional[str] = None,
         virtual_key: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        stream: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        fallback_model_ids: Optional[List[str]] = None,
+        prompt_caching: Optional[bool] = None,
+        rate_limiter: Optional[RateLimiter] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.model_id = model_id
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.stream = stream
+        self.on_delta = on_delta
+        self.last_time_to_first_token: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(model_id)
+        self.prompt_caching = prompt_caching if prompt_caching is not None else "claude" in model_id.lower()
+        self.last_cached_input_token_count: Optional[int] = None
 
         if api_key is None:
             api_key = os.getenv("PORTKEY_API_KEY")
         if virtual_key is None:
             # Try to get virtual key from env based on model
-            if "claude" in model_id.lower():
-                virtual_key = os.getenv("PORTKEY_VIRTUAL_KEY_ANTHROPIC")
-            elif "gemini" in model_id.lower():
-                virtual_key = os.getenv("PORTKEY_VIRTUAL_KEY_GOOGLE")
-            else:
-                virtual_key = os.getenv("PORTKEY_VIRTUAL_KEY_OPENAI") 
+            virtual_key = virtual_key_for_model(model_id)
+        if fallback_model_ids is None:
+            fallback_model_ids = [m.strip() for m in os.getenv("PORTKEY_FALLBACK_MODELS", "").split(",") if m.strip()]
+
+        # Fallbacks only get cache_control breakpoints if they are Claude models themselves
+        self.routes = [self._make_route(model_id, api_key, virtual_key, self.prompt_caching)] + [
+            self._make_route(
+                fallback_model_id,
+                api_key,
+                virtual_key_for_model(fallback_model_id),
+                prompt_caching is not False and "claude" in fallback_model_id.lower(),
+            )
+            for fallback_model_id in fallback_model_ids
+        ]
+        self.client = self.routes[0].client
 
-        self.client = Portkey(
-            api_key=api_key,
-            virtual_key=virtual_key
+    @staticmethod
+    def _make_route(
+        model_id: str, api_key: Optional[str], virtual_key: Optional[str], prompt_caching: bool = False
+    ) -> _Route:
+        client_kwargs = {"api_key": api_key, "virtual_key": virtual_key}
+        return _Route(
+            model_id=model_id,
+            client=Portkey(**client_kwargs),
+            client_kwargs=client_kwargs,
+            breaker=get_circuit_breaker(f"{virtual_key}:{model_id}"),
+            prompt_caching=prompt_caching,
         )
 
+    @staticmethod
+    def _route_kwargs(route: _Route, completion_kwargs: Dict) -> Dict:
+        """The request for one route: its model id, and messages prepared for that model."""
+        route_kwargs = {**completion_kwargs, "model": route.model_id}
+        if route.prompt_caching:
+            route_kwargs["messages"] = mark_cache_breakpoints(completion_kwargs["messages"])
+        return route_kwargs
+
+    def _create(self, completion_kwargs: Dict, **extra_kwargs) -> Any:
+        """Call chat.completions.create, retrying transient errors and failing over across routes."""
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.retry_policy.max_retries + 1):
+            # Use the first route whose circuit is closed: the fallbacks only take over once it opens
+            route = next((route for route in self.routes if route.breaker.allow()), None)
+            if route is not None:
+                try:
+                    response = route.client.chat.completions.create(
+                        **self._route_kwargs(route, completion_kwargs), **extra_kwargs
+                    )
+                except Exception as e:
+                    if not is_retryable(e, self.retry_policy):
+                        # A bad request says nothing about the route's health
+                        route.breaker.release_trial()
+                        raise
+                    route.breaker.record_failure()
+                    last_error = e
+                else:
+                    route.breaker.record_success()
+                    return response
+            if attempt < self.retry_policy.max_retries:
+                time.sleep(self.retry_policy.delay(attempt, get_retry_after(last_error)))
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"All routes for {self.model_id} are failing, try again later.")
+
+    async def _acreate(self, completion_kwargs: Dict, **extra_kwargs) -> Any:
+        """Async version of `_create`."""
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.retry_policy.max_retries + 1):
+            # Use the first route whose circuit is closed: the fallbacks only take over once it opens
+            route = next((route for route in self.routes if route.breaker.allow()), None)
+            if route is not None:
+                try:
+                    response = await route.get_async_client().chat.completions.create(
+                        **self._route_kwargs(route, completion_kwargs), **extra_kwargs
+                    )
+                except Exception as e:
+                    if not is_retryable(e, self.retry_policy):
+                        # A bad request says nothing about the route's health
+                        route.breaker.release_trial()
+                        raise
+                    route.breaker.record_failure()
+                    last_error = e
+                else:
+                    route.breaker.record_success()
+                    return response
+            if attempt < self.retry_policy.max_retries:
+                await asyncio.sleep(self.retry_policy.delay(attempt, get_retry_after(last_error)))
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"All routes for {self.model_id} are failing, try again later.")
+
     def __call__(
         self,
         messages: List[Dict[str, str]],
@@ -54,10 +281,107 @@ class PortkeyModel(Model):
         tools_to_call_from: Optional[List[Tool]] = None,
         **kwargs,
     ) -> ChatMessage:
+        completion_kwargs = self._build_completion_kwargs(messages, stop_sequences, grammar, tools_to_call_from, **kwargs)
+
+        key, cached = self._cache_lookup(completion_kwargs)
+        if cached is not None:
+            self._record_call(0.0, cached["usage"], cache_hit=True)
+            return self._to_chat_message(cached["message"], cached["usage"], cached, tools_to_call_from)
+
+        estimated_tokens = estimate_message_tokens(completion_kwargs["messages"]) if self.rate_limiter is not None else 0
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimated_tokens)
+        usage = None
+        start_time = time.perf_counter()
+        try:
+            if self.stream:
+                message_dict, usage, raw = self._stream_completion(completion_kwargs, stop_sequences, start_time)
+            else:
+                response = self._create(completion_kwargs)
+                self.last_time_to_first_token = None
+                message_dict, usage, raw = self._parse_response(response)
+            self.last_latency = time.perf_counter() - start_time
+        except Exception as e:
+            self._record_call(time.perf_counter() - start_time, error=repr(e))
+            raise
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(estimated_tokens, self._total_tokens(usage))
+        self._record_call(self.last_latency, usage, time_to_first_token=self.last_time_to_first_token)
+        self._cache_store(key, message_dict, usage)
+        return self._to_chat_message(message_dict, usage, raw, tools_to_call_from)
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        """Async version of `__call__`, using an `AsyncPortkey` client. Streaming is not used on this path."""
+        completion_kwargs = self._build_completion_kwargs(messages, stop_sequences, grammar, tools_to_call_from, **kwargs)
+
+        key, cached = self._cache_lookup(completion_kwargs)
+        if cached is not None:
+            self._record_call(0.0, cached["usage"], cache_hit=True)
+            return self._to_chat_message(cached["message"], cached["usage"], cached, tools_to_call_from)
+
+        estimated_tokens = estimate_message_tokens(completion_kwargs["messages"]) if self.rate_limiter is not None else 0
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(estimated_tokens)
+        usage = None
+        start_time = time.perf_counter()
+        try:
+            response = await self._acreate(completion_kwargs)
+            self.last_time_to_first_token = None
+            self.last_latency = time.perf_counter() - start_time
+            message_dict, usage, raw = self._parse_response(response)
+        except Exception as e:
+            self._record_call(time.perf_counter() - start_time, error=repr(e))
+            raise
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(estimated_tokens, self._total_tokens(usage))
+        self._record_call(self.last_latency, usage, time_to_first_token=self.last_time_to_first_token)
+        self._cache_store(key, message_dict, usage)
+        return self._to_chat_message(message_dict, usage, raw, tools_to_call_from)
+
+    async def abatch(
+        self, messages_list: List[List[Dict[str, str]]], max_concurrency: int = 8, **kwargs
+    ) -> List[ChatMessage]:
+        """Run `acall` on every message list, with at most `max_concurrency` requests in flight."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded_call(messages):
+            async with semaphore:
+                return await self.acall(messages, **kwargs)
+
+        return await asyncio.gather(*(bounded_call(messages) for messages in messages_list))
+
+    def batch(self, messages_list: List[List[Dict[str, str]]], max_concurrency: int = 8, **kwargs) -> List[ChatMessage]:
+        """Run independent completions concurrently and return their messages in order.
+
+        Can be called from synchronous code, including worker threads: the requests are multiplexed
+        over a shared connection pool on a background event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.abatch(messages_list, max_concurrency=max_concurrency, **kwargs), get_background_loop()
+        )
+        return future.result()
+
+    def _build_completion_kwargs(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> Dict:
         # Convert max_tokens to max_completion_tokens if present
         if 'max_tokens' in kwargs:
             kwargs['max_completion_tokens'] = kwargs.pop('max_tokens')
-            
+
         completion_kwargs = self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
@@ -66,21 +390,169 @@ class PortkeyModel(Model):
             model=self.model_id,
             **kwargs,
         )
+        # cache_control breakpoints are added per route, since only Claude routes accept them
+        return completion_kwargs
 
-        response = self.client.chat.completions.create(**completion_kwargs)
+    def _record_call(
+        self,
+        latency: float,
+        usage: Optional[Dict] = None,
+        time_to_first_token: Optional[float] = None,
+        cache_hit: bool = False,
+        error: Optional[str] = None,
+    ) -> None:
+        usage = usage or {}
+        get_recorder().record(
+            self.model_id,
+            latency,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            cached_tokens=usage.get("cached_tokens", 0),
+            time_to_first_token=time_to_first_token,
+            cache_hit=cache_hit,
+            error=error,
+        )
 
-        self.last_input_token_count = response.usage.prompt_tokens if response.usage.prompt_tokens is not None else 0
-        self.last_output_token_count = response.usage.completion_tokens if response.usage.completion_tokens is not None else 0
+    def _cache_lookup(self, completion_kwargs: Dict) -> Tuple[Optional[str], Optional[Dict]]:
+        if self.cache is None:
+            return None, None
+        try:
+            key = cache_key(completion_kwargs)
+        except TypeError as e:
+            # Holds a value with no stable serialization, it would never hit
+            if self.cache.mode == "replay":
+                raise CacheMissError(str(e)) from e
+            return None, None
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.last_time_to_first_token = None
+            self.last_latency = 0.0
+        return key, cached
 
-        message = ChatMessage.from_dict(
-            response.choices[0].message.model_dump(include={"role", "content", "tool_calls"})
-        )
-        message.raw = response
+    def _cache_store(self, key: Optional[str], message_dict: Dict, usage: Dict) -> None:
+        if self.cache is not None and key is not None:
+            self.cache.put(key, {"message": message_dict, "usage": usage}, model_id=self.model_id)
+
+    @staticmethod
+    def _total_tokens(usage: Optional[Dict]) -> Optional[int]:
+        return usage["prompt_tokens"] + usage["completion_tokens"] if usage is not None else None
+
+    @staticmethod
+    def _parse_response(response) -> Tuple[Dict, Dict, Any]:
+        message_dict = response.choices[0].message.model_dump(include={"role", "content", "tool_calls"})
+        return message_dict, usage_to_dict(response.usage), response
+
+    def _to_chat_message(
+        self, message_dict: Dict, usage: Dict, raw: Any, tools_to_call_from: Optional[List[Tool]]
+    ) -> ChatMessage:
+        self.last_input_token_count = usage["prompt_tokens"]
+        self.last_output_token_count = usage["completion_tokens"]
+        self.last_cached_input_token_count = usage.get("cached_tokens", 0)
+
+        message = ChatMessage.from_dict(message_dict)
+        message.raw = raw
 
         if tools_to_call_from is not None:
             return parse_tool_args_if_needed(message)
         return message
 
+    def _stream_completion(
+        self, completion_kwargs: Dict, stop_sequences: Optional[List[str]], start_time: float
+    ) -> Tuple[Dict, Dict, List[Any]]:
+        """Stream a completion, assembling content and tool calls from the deltas.
+
+        A transient error while reading the stream starts the completion over, unless deltas were already
+        passed to `on_delta`: its consumer can't take them back. Returns the assembled message dict, the
+        token usage and the list of received chunks.
+        """
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.retry_policy.max_retries + 1):
+            # Opening the stream is retried by _create itself
+            stream = self._create(completion_kwargs, stream=True, stream_options={"include_usage": True})
+            delivered = []
+            try:
+                return self._consume_stream(stream, completion_kwargs, stop_sequences, start_time, delivered)
+            except Exception as e:
+                if delivered or not is_retryable(e, self.retry_policy) or attempt == self.retry_policy.max_retries:
+                    raise
+                last_error = e
+            time.sleep(self.retry_policy.delay(attempt, get_retry_after(last_error)))
+        raise last_error
+
+    def _consume_stream(
+        self,
+        stream: Any,
+        completion_kwargs: Dict,
+        stop_sequences: Optional[List[str]],
+        start_time: float,
+        delivered: List[str],
+    ) -> Tuple[Dict, Dict, List[Any]]:
+        self.last_time_to_first_token = None
+        content = ""
+        tool_calls: Dict[int, Dict] = {}
+        usage = None
+        chunks = []
+        stopped_early = False
+        for chunk in stream:
+            chunks.append(chunk)
+            if getattr(chunk, "usage", None) is not None:
+                usage = usage_to_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if self.last_time_to_first_token is None and (delta.content or delta.tool_calls):
+                self.last_time_to_first_token = time.perf_counter() - start_time
+            if delta.content:
+                content += delta.content
+                if self.on_delta is not None:
+                    delivered.append(delta.content)
+                    self.on_delta(delta.content)
+                if stop_sequences:
+                    # The new delta may complete a stop sequence that started in a previous one
+                    search_start = max(0, len(content) - len(delta.content) - max(len(s) for s in stop_sequences))
+                    positions = [content.find(s, search_start) for s in stop_sequences]
+                    positions = [p for p in positions if p != -1]
+                    if positions:
+                        content = content[: min(positions)]
+                        stopped_early = True
+                        break
+            for tool_call_delta in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    tool_call_delta.index,
+                    {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if tool_call_delta.id:
+                    tool_call["id"] = tool_call_delta.id
+                if tool_call_delta.function is not None:
+                    if tool_call_delta.function.name:
+                        tool_call["function"]["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        tool_call["function"]["arguments"] += tool_call_delta.function.arguments
+
+        if stopped_early:
+            # Stop reading from the server: the rest of the generation is not needed
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        if usage is None or not usage["completion_tokens"]:
+            # The usage chunk comes last, so it is missing when we stopped early or the provider doesn't send it
+            generated = content + "".join(
+                call["function"]["name"] + call["function"]["arguments"] for call in tool_calls.values()
+            )
+            prompt_tokens = usage["prompt_tokens"] if usage else estimate_message_tokens(completion_kwargs["messages"])
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": estimate_tokens(generated),
+                "cached_tokens": usage.get("cached_tokens", 0) if usage else 0,
+            }
+
+        message_dict = {
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [tool_calls[index] for index in sorted(tool_calls)] or None,
+        }
+        return message_dict, usage, chunks
+
     def _prepare_completion_kwargs(
         self,
         messages: List[Dict[str, str]],
@@ -1,9 +1,14 @@
-from typing import Optional
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 from smolagents import Tool
 from smolagents.models import MessageRole, Model
 
-from .mdconvert import MarkdownConverter
+from .conversion_cache import CachedMarkdownConverter, LRUCache
+from .llm_metrics import call_context
+from .text_retrieval import CHARS_PER_TOKEN, chunk_text, estimate_tokens, select_relevant_chunks
 
 
 class TextInspectorTool(Tool):
@@ -24,14 +29,134 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
         },
     }
     output_type = "string"
-    md_converter = MarkdownConverter()
-
-    def __init__(self, model: Model, text_limit: int):
+    md_converter = CachedMarkdownConverter()
+    # Chunk notes from map_reduce mode, keyed by a hash of the model, question and chunk content
+    chunk_notes_cache = LRUCache(max_entries=1024)
+
+    def __init__(
+        self,
+        model: Model,
+        text_limit: int,
+        mode: str = "truncate",
+        retrieval_token_budget: int = 8000,
+        chunk_tokens: int = 1000,
+        map_chunk_tokens: Optional[int] = None,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            model: The model used to caption documents and answer questions about them.
+            text_limit: Maximum number of characters of the document sent to the model in "truncate" mode.
+            mode: How documents are turned into a prompt. "truncate" sends the first `text_limit` characters,
+                "retrieval" sends only the chunks most relevant to the question (BM25 ranked) that fit
+                in `retrieval_token_budget` tokens, "map_reduce" extracts notes from every chunk of documents
+                longer than `text_limit` in parallel and answers from the combined notes.
+            retrieval_token_budget: Token budget for the document excerpts in "retrieval" mode.
+            chunk_tokens: Size of the chunks the document is split into in "retrieval" mode.
+            map_chunk_tokens: Size of the chunks in "map_reduce" mode. Defaults to a quarter of `text_limit`.
+            max_workers: Maximum number of chunks summarized concurrently in "map_reduce" mode.
+        """
         super().__init__()
+        if mode not in ("truncate", "retrieval", "map_reduce"):
+            raise ValueError(f"Unknown mode '{mode}', expected 'truncate', 'retrieval' or 'map_reduce'.")
+        for name, value in [
+            ("retrieval_token_budget", retrieval_token_budget),
+            ("chunk_tokens", chunk_tokens),
+            ("map_chunk_tokens", map_chunk_tokens),
+        ]:
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive, got {value}.")
         self.model = model
         self.text_limit = text_limit
+        self.mode = mode
+        self.retrieval_token_budget = retrieval_token_budget
+        self.chunk_tokens = chunk_tokens
+        self.map_chunk_tokens = map_chunk_tokens or max(1, text_limit // CHARS_PER_TOKEN // 4)
+        self.max_workers = max_workers
+
+    def _document_for_prompt(self, text_content: str, question: str) -> Tuple[str, str]:
+        """Return a description of what is sent ("complete file" or excerpts) and the text to send."""
+        if self.mode == "retrieval" and estimate_tokens(text_content) > self.retrieval_token_budget:
+            chunks = select_relevant_chunks(
+                text_content,
+                question,
+                token_budget=self.retrieval_token_budget,
+                chunk_tokens=self.chunk_tokens,
+            )
+            return "the excerpts of the file most relevant to the question", "\n\n[...]\n\n".join(chunks)
+        if self.mode == "map_reduce" and len(text_content) > self.text_limit:
+            return "notes taken on every part of the file", self._map_reduce(text_content, question)
+        return "the complete file", text_content[: self.text_limit]
+
+    def _chunk_notes_key(self, chunk: str, question: str) -> str:
+        return hashlib.sha256(
+            "\0".join([str(getattr(self.model, "model_id", "")), question, chunk]).encode("utf-8")
+        ).hexdigest()
+
+    def _chunk_notes_messages(
+        self, chunk: str, index: int, total: int, question: str, source: str = "a file"
+    ) -> List[dict]:
+        return [
+            {
+                "role": MessageRole.SYSTEM,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Here is part {index + 1} of {total} of {source}:\n\n" + chunk,
+                    }
+                ],
+            },
+            {
+                "role": MessageRole.USER,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Take concise notes on this part of the file, keeping every fact, number, name and date that could help answer this question: "
+                        + question
+                        + "\n\nIf this part contains nothing relevant, just say so in one sentence.",
+                    }
+                ],
+            },
+        ]
+
+    def _map_reduce(self, text_content: str, question: str) -> str:
+        """Take notes on every chunk of the document, then notes on the notes, until they fit in `text_limit`."""
+        notes = self._map_chunks(text_content, question)
+        while len(notes) > self.text_limit:
+            reduced = self._map_chunks(notes, question, source="notes taken on a file")
+            if len(reduced) >= len(notes):
+                # The model no longer condenses the notes: say what is cut rather than hiding it
+                return notes[: self.text_limit] + "\n\n[... notes cut to fit the length limit]"
+            notes = reduced
+        return notes
+
+    def _map_chunks(self, text_content: str, question: str, source: str = "a file") -> str:
+        """Take notes on every chunk of the document concurrently and join them in document order."""
+        chunks: List[str] = chunk_text(text_content, chunk_tokens=self.map_chunk_tokens)
+        keys = [self._chunk_notes_key(chunk, question) for chunk in chunks]
+        notes = [self.chunk_notes_cache.get(key) for key in keys]
+        missing = [i for i, note in enumerate(notes) if note is None]
+        messages_list = [self._chunk_notes_messages(chunks[i], i, len(chunks), question, source) for i in missing]
+
+        if hasattr(self.model, "batch"):
+            # Models with a batch API multiplex the calls over one connection pool
+            responses = self.model.batch(messages_list, max_concurrency=self.max_workers)
+        else:
+            # Run each call in a copy of the caller's context so that metrics labels follow it into the threads
+            context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                responses = list(executor.map(lambda messages: context.copy().run(self.model, messages), messages_list))
+
+        for i, response in zip(missing, responses):
+            notes[i] = response.content
+            self.chunk_notes_cache.put(keys[i], response.content)
+        return "\n\n".join(f"Notes on part {i + 1}/{len(chunks)}:\n{note}" for i, note in enumerate(notes))
 
     def forward_initial_exam_mode(self, file_path, question):
+        with call_context(tool=self.name):
+            return self._forward_initial_exam_mode(file_path, question)
+
+    def _forward_initial_exam_mode(self, file_path, question):
         result = self.md_converter.convert(file_path)
 
         if file_path[-4:] in [".png", ".jpg"]:
@@ -46,6 +171,7 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
         if len(result.text_content) < 4000:
             return "Document content: " + result.text_content
 
+        _, document_text = self._document_for_prompt(result.text_content, question)
         messages = [
             {
                 "role": MessageRole.SYSTEM,
@@ -55,7 +181,7 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
                         "text": "Here is a file:\n### "
                         + str(result.title)
                         + "\n\n"
-                        + result.text_content[: self.text_limit],
+                        + document_text,
                     }
                 ],
             },
@@ -74,6 +200,10 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
         return self.model(messages).content
 
     def forward(self, file_path, question: Optional[str] = None) -> str:
+        with call_context(tool=self.name):
+            return self._forward(file_path, question)
+
+    def _forward(self, file_path, question: Optional[str] = None) -> str:
         result = self.md_converter.convert(file_path)
 
         if file_path[-4:] in [".png", ".jpg"]:
@@ -85,6 +215,7 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
         if not question:
             return result.text_content
 
+        document_description, document_text = self._document_for_prompt(result.text_content, question)
         messages = [
             {
                 "role": MessageRole.SYSTEM,
@@ -101,10 +232,10 @@ This tool handles the following file extensions: [".html", ".htm", ".xlsx", ".pp
                 "content": [
                     {
                         "type": "text",
-                        "text": "Here is the complete file:\n### "
+                        "text": f"Here is {document_description}:\n### "
                         + str(result.title)
                         + "\n\n"
-                        + result.text_content[: self.text_limit],
+                        + document_text,
                     }
                 ],
             },
@@ -0,0 +1,112 @@
+import math
+import re
+from collections import Counter
+from typing import List, Optional
+
+
+# On average a token is about 4 characters of English text
+CHARS_PER_TOKEN = 4
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token count estimate, good enough for budgeting prompts."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, chunk_tokens: int = 1000, overlap_tokens: int = 100) -> List[str]:
+    """Split markdown text into chunks of roughly `chunk_tokens` tokens.
+
+    Paragraph boundaries are preferred; paragraphs longer than a chunk are hard-split.
+    Consecutive chunks share about `overlap_tokens` tokens of context.
+    """
+    if chunk_tokens <= 0:
+        raise ValueError(f"chunk_tokens must be positive, got {chunk_tokens}.")
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, chunk_chars // 2)
+
+    pieces = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        if not paragraph.strip():
+            continue
+        while len(paragraph) > chunk_chars:
+            pieces.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars - overlap_chars :]
+        pieces.append(paragraph)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > chunk_chars:
+            chunks.append(current)
+            current = current[-overlap_chars:] if overlap_chars else ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 ranking over a list of text chunks."""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if chunks else 0.0
+        document_freqs = Counter()
+        for tf in self._term_freqs:
+            document_freqs.update(tf.keys())
+        n = len(chunks)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_freqs.items()}
+
+    def scores(self, query: str) -> List[float]:
+        query_terms = set(tokenize(query))
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def rank(self, query: str) -> List[int]:
+        """Return chunk indices ordered from most to least relevant."""
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+
+def select_relevant_chunks(
+    text: str,
+    question: str,
+    token_budget: int = 8000,
+    chunk_tokens: int = 1000,
+    top_k: Optional[int] = None,
+) -> List[str]:
+    """Return the chunks of `text` most relevant to `question` that fit in `token_budget`.
+
+    Chunks are returned in document order so the excerpt still reads naturally.
+    """
+    chunks = chunk_text(text, chunk_tokens=chunk_tokens)
+    selected = []
+    used_tokens = 0
+    for index in BM25Index(chunks).rank(question):
+        if top_k is not None and len(selected) >= top_k:
+            break
+        chunk_cost = estimate_tokens(chunks[index])
+        if used_tokens + chunk_cost > token_budget:
+            continue
+        selected.append(index)
+        used_tokens += chunk_cost
+    return [chunks[i] for i in sorted(selected)]
@@ -0,0 +1,122 @@
+"""Summarize a TRACE_FILE written by scripts/tracing.py.
+
+    python -m scripts.trace_report trace.jsonl                 # per-trace timeline + hot spans
+    python -m scripts.trace_report trace.jsonl --trace <id>    # a single trace
+    python -m scripts.trace_report trace.jsonl --folded > out.folded   # input for flamegraph.pl / speedscope
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+
+def load_spans(path: str) -> List[Dict]:
+    spans = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def duration(span: Dict) -> float:
+    return (span["end_time_unix_nano"] - span["start_time_unix_nano"]) / 1e9
+
+
+def build_children(spans: List[Dict]) -> Dict[str, List[Dict]]:
+    """Map each span id to its children, in start order. Roots (and orphans) are under the "" key."""
+    span_ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        parent = span["parent_span_id"]
+        children[parent if parent in span_ids else ""].append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda s: s["start_time_unix_nano"])
+    return children
+
+
+def self_time(span: Dict, children: Dict[str, List[Dict]]) -> float:
+    """Time spent in the span itself, not in its children. Never negative, even with parallel children."""
+    return max(0.0, duration(span) - sum(duration(child) for child in children.get(span["span_id"], [])))
+
+
+def span_label(span: Dict) -> str:
+    attributes = span["attributes"]
+    details = [f"{key}={attributes[key]}" for key in ("task_id", "gen_ai.request.model", "query") if key in attributes]
+    if span["status"] == "ERROR":
+        details.append("ERROR")
+    return span["name"] + (f" [{', '.join(details)}]" if details else "")
+
+
+def print_timeline(root: Dict, children: Dict[str, List[Dict]], min_duration: float) -> None:
+    origin = root["start_time_unix_nano"]
+
+    def visit(span: Dict, depth: int) -> None:
+        if duration(span) < min_duration:
+            return
+        offset = (span["start_time_unix_nano"] - origin) / 1e9
+        print(f"{offset:9.2f}s {duration(span):9.2f}s  {'  ' * depth}{span_label(span)}")
+        for child in children.get(span["span_id"], []):
+            visit(child, depth + 1)
+
+    print(f"\ntrace {root['trace_id']} ({duration(root):.2f}s)")
+    print(f"{'start':>10} {'duration':>10}  span")
+    visit(root, 0)
+
+
+def print_hot_spans(spans: List[Dict], children: Dict[str, List[Dict]], top: int) -> None:
+    totals = defaultdict(lambda: {"count": 0, "total": 0.0, "self": 0.0, "errors": 0})
+    for span in spans:
+        entry = totals[span["name"]]
+        entry["count"] += 1
+        entry["total"] += duration(span)
+        entry["self"] += self_time(span, children)
+        entry["errors"] += span["status"] == "ERROR"
+
+    print(f"\n{'span':<40} {'count':>7} {'total':>10} {'self':>10} {'errors':>7}")
+    for name, entry in sorted(totals.items(), key=lambda item: item[1]["self"], reverse=True)[:top]:
+        print(f"{name[:40]:<40} {entry['count']:>7} {entry['total']:>9.2f}s {entry['self']:>9.2f}s {entry['errors']:>7}")
+
+
+def folded_stacks(roots: List[Dict], children: Dict[str, List[Dict]]) -> Dict[str, int]:
+    """Self time per stack in microseconds, in the "root;child;leaf value" format of flamegraph.pl."""
+    stacks = defaultdict(int)
+
+    def visit(span: Dict, prefix: str) -> None:
+        stack = f"{prefix};{span['name']}" if prefix else span["name"]
+        stacks[stack] += int(self_time(span, children) * 1e6)
+        for child in children.get(span["span_id"], []):
+            visit(child, stack)
+
+    for root in roots:
+        visit(root, "")
+    return stacks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a trace file written with TRACE_FILE set.")
+    parser.add_argument("trace_file", type=str)
+    parser.add_argument("--trace", type=str, default=None, help="Only report this trace id.")
+    parser.add_argument("--min-duration", type=float, default=0.0, help="Hide spans shorter than this (seconds).")
+    parser.add_argument("--top", type=int, default=20, help="Number of span names in the hot spans table.")
+    parser.add_argument("--folded", action="store_true", help="Print folded stacks for flame graph tools instead.")
+    args = parser.parse_args()
+
+    spans = [span for span in load_spans(args.trace_file) if args.trace is None or span["trace_id"] == args.trace]
+    children = build_children(spans)
+    roots = children.get("", [])
+
+    if args.folded:
+        for stack, value in sorted(folded_stacks(roots, children).items()):
+            print(f"{stack} {value}")
+        return
+
+    for root in roots:
+        print_timeline(root, children, args.min_duration)
+    print_hot_spans(spans, children, args.top)
+
+
+if __name__ == "__main__":
+    main()
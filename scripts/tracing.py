@@ -0,0 +1,221 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .rate_limiter import message_usage
+
+
+# Spans are written in the OpenTelemetry span data model (trace/span ids, parent id, nanosecond
+# timestamps, attributes, events, status), one JSON object per line, so they can be loaded by the
+# trace report CLI or converted for any OTLP-compatible backend.
+
+
+class Span:
+    """A timed operation. Spans opened while another is current become its children."""
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes)
+        self.events: List[Dict[str, Any]] = []
+        self.status = "OK"
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": attributes})
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.add_event("exception", **{"exception.type": type(error).__name__, "exception.message": str(error)})
+
+    def end(self) -> None:
+        self.end_time_unix_nano = time.time_ns()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": self.status,
+            "thread": threading.current_thread().name,
+        }
+
+
+class Tracer:
+    """Records spans to a JSONL file. Finished spans are appended and flushed one line at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_tracer: Optional[Tracer] = None
+_tracer_configured = False
+_tracer_lock = threading.Lock()
+
+
+def configure_tracing(path: Optional[str]) -> Optional[Tracer]:
+    """Write spans to `path`, or disable tracing if None."""
+    global _tracer, _tracer_configured
+    with _tracer_lock:
+        _tracer = Tracer(path) if path else None
+        _tracer_configured = True
+        return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Return the process-wide tracer, configured from the TRACE_FILE env var on first use. None if tracing is off."""
+    if not _tracer_configured:
+        configure_tracing(os.getenv("TRACE_FILE"))
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time the block as a span, child of the current one. Yields None (and costs nothing) when tracing is off."""
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    parent = _current_span.get()
+    new_span = Span(
+        name,
+        trace_id=parent.trace_id if parent is not None else secrets.token_hex(16),
+        parent_span_id=parent.span_id if parent is not None else None,
+        attributes={k: v for k, v in attributes.items() if v is not None},
+    )
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end()
+        tracer.export(new_span)
+
+
+def traced(name: Optional[str] = None, **attributes: Any) -> Callable:
+    """Decorator running the function inside a span, named after the function by default."""
+
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracedModel:
+    """Wraps a smolagents model so that each call is a span carrying the model id and token usage."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, *args, **kwargs):
+        with span("llm", **{"gen_ai.request.model": str(self.model.model_id)}) as llm_span:
+            message = self.model(*args, **kwargs)
+            # Read from the message rather than the model, whose counters other threads may have overwritten
+            usage = message_usage(message)
+            if llm_span is not None and usage is not None:
+                llm_span.set_attribute("gen_ai.usage.input_tokens", usage[0])
+                llm_span.set_attribute("gen_ai.usage.output_tokens", usage[1])
+            return message
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+def _trace_tool(tool) -> None:
+    if getattr(tool, "_traced", False):
+        return
+    forward = tool.forward
+
+    @functools.wraps(forward)
+    def traced_forward(*args, **kwargs):
+        with span(f"tool {tool.name}", **{"tool.name": tool.name}):
+            return forward(*args, **kwargs)
+
+    tool.forward = traced_forward
+    tool._traced = True
+
+
+def _record_step(step_log, agent=None) -> None:
+    parent = _current_span.get()
+    if parent is None:
+        return
+    parent.add_event(
+        "agent.step",
+        step_number=getattr(step_log, "step_number", None),
+        duration=getattr(step_log, "duration", None),
+        error=str(step_log.error) if getattr(step_log, "error", None) else None,
+    )
+
+
+def instrument_agent(agent, name: Optional[str] = None) -> Any:
+    """Trace an agent's runs, model calls, tool calls and managed agents, recursively.
+
+    Each `run` becomes an "agent.run" span and each finished step an event on it. Does nothing when
+    tracing is off, so it can be called unconditionally.
+    """
+    if get_tracer() is None or getattr(agent, "_traced", False):
+        return agent
+    agent_name = name or getattr(agent, "name", None) or type(agent).__name__
+
+    agent.model = TracedModel(agent.model)
+    for tool in agent.tools.values():
+        _trace_tool(tool)
+    for managed_agent in (getattr(agent, "managed_agents", None) or {}).values():
+        # smolagents<1.8 wraps managed agents in a ManagedAgent holding the actual agent
+        instrument_agent(getattr(managed_agent, "agent", managed_agent))
+
+    run = agent.run
+
+    @functools.wraps(run)
+    def traced_run(*args, **kwargs):
+        with span("agent.run", **{"agent.name": agent_name}):
+            return run(*args, **kwargs)
+
+    agent.run = traced_run
+    agent.step_callbacks.append(_record_step)
+    agent._traced = True
+    return agent
@@ -1,4 +1,5 @@
 import base64
+import functools
 import json
 import mimetypes
 import os
@@ -10,14 +11,18 @@ import requests
 from dotenv import load_dotenv
 from huggingface_hub import InferenceClient
 from PIL import Image
-from transformers import AutoProcessor
 
 from smolagents import Tool, tool
 
 
 load_dotenv(override=True)
 
-idefics_processor = AutoProcessor.from_pretrained("HuggingFaceM4/idefics2-8b-chatty")
+@functools.lru_cache(maxsize=None)
+def get_idefics_processor():
+    """Loaded on first use: importing transformers and fetching the processor from the hub take seconds."""
+    from transformers import AutoProcessor
+
+    return AutoProcessor.from_pretrained("HuggingFaceM4/idefics2-8b-chatty")
 
 
 def process_images_and_text(image_path, query, client):
@@ -31,7 +36,7 @@ def process_images_and_text(image_path, query, client):
         },
     ]
 
-    prompt_with_template = idefics_processor.apply_chat_template(messages, add_generation_prompt=True)
+    prompt_with_template = get_idefics_processor().apply_chat_template(messages, add_generation_prompt=True)
 
     # load images from local directory
 
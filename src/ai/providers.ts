@@ -2,6 +2,8 @@ import { getEncoding } from 'js-tiktoken';
 import { RecursiveCharacterTextSplitter } from './text-splitter';
 import fetch from 'node-fetch';
 
+import { llmLimiter } from '../concurrency';
+
 interface PortkeyResponse {
   id: string;
   object: string;
@@ -28,30 +30,46 @@ interface ChatMessage {
   content: string;
 }
 
-export async function callPortkeyAPI(messages: ChatMessage[], options: { reasoningEffort?: string; structuredOutputs?: boolean } = {}) {
-  const response = await fetch('https://api.portkey.ai/v1/chat/completions', {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-      'x-portkey-api-key': process.env.PORTKEY_API_KEY!,
-      'x-portkey-virtual-key': process.env.PORTKEY_VIRTUAL_KEY_OPENAI!,
-    },
-    body: JSON.stringify({
-      model: process.env.OPENAI_MODEL || 'o3-mini',
-      messages,
-    }),
-  });
+type ModelOptions = {
+  reasoningEffort?: string;
+  structuredOutputs?: boolean;
+  // Receives the token usage reported by the provider
+  onUsage?: (usage: PortkeyResponse['usage']) => void;
+};
 
-  if (!response.ok) {
-    throw new Error(`Portkey API error: ${response.statusText}`);
-  }
+export async function callPortkeyAPI(messages: ChatMessage[], options: ModelOptions = {}) {
+  // Counted from request to parsed body, and throwing inside the limiter so errors adjust its limit
+  const data: PortkeyResponse = await llmLimiter.run(async () => {
+    const response = await fetch('https://api.portkey.ai/v1/chat/completions', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'x-portkey-api-key': process.env.PORTKEY_API_KEY!,
+        'x-portkey-virtual-key': process.env.PORTKEY_VIRTUAL_KEY_OPENAI!,
+      },
+      body: JSON.stringify({
+        model: process.env.OPENAI_MODEL || 'o3-mini',
+        messages,
+      }),
+    });
 
-  const data: PortkeyResponse = await response.json();
+    if (!response.ok) {
+      throw Object.assign(
+        new Error(`Portkey API error: ${response.status} ${response.statusText}`),
+        { status: response.status },
+      );
+    }
+
+    return (await response.json()) as PortkeyResponse;
+  });
+  if (data.usage) {
+    options.onUsage?.(data.usage);
+  }
   return data.choices[0]?.message?.content || '';
 }
 
 // Models
-export const o3MiniModel = async (prompt: string, options: { reasoningEffort?: string; structuredOutputs?: boolean } = {}) => {
+export const o3MiniModel = async (prompt: string, options: ModelOptions = {}) => {
   const messages: ChatMessage[] = [
     { role: 'user', content: prompt }
   ];
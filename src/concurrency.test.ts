@@ -0,0 +1,66 @@
+import assert from 'node:assert';
+import { describe, it } from 'node:test';
+
+import { AdaptiveLimiter, isOverloadError } from './concurrency';
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+
+describe('AdaptiveLimiter', () => {
+  it('Should never run more operations than the limit', async () => {
+    const limiter = new AdaptiveLimiter(2, 1, 2);
+    let running = 0;
+    let maxRunning = 0;
+
+    await Promise.all(
+      Array.from({ length: 6 }, () =>
+        limiter.run(async () => {
+          running++;
+          maxRunning = Math.max(maxRunning, running);
+          await sleep(5);
+          running--;
+        }),
+      ),
+    );
+
+    assert.strictEqual(maxRunning, 2);
+    assert.strictEqual(limiter.stats().inFlight, 0);
+  });
+
+  it('Should grow the limit on success and halve it on overload', async () => {
+    // Latency gating disabled: the timings of no-op operations are noise
+    const limiter = new AdaptiveLimiter(8, 1, 4, Infinity);
+
+    for (let i = 0; i < 40; i++) {
+      await limiter.run(async () => {});
+    }
+    assert.strictEqual(limiter.stats().limit, 8);
+
+    await assert.rejects(
+      limiter.run(async () => {
+        throw Object.assign(new Error('Too Many Requests'), { status: 429 });
+      }),
+    );
+    assert.strictEqual(limiter.stats().limit, 4);
+  });
+
+  it('Should not shrink the limit on errors that are not overloads', async () => {
+    const limiter = new AdaptiveLimiter(8, 1, 4);
+
+    await assert.rejects(
+      limiter.run(async () => {
+        throw new Error('Failed to parse JSON response');
+      }),
+    );
+    assert.strictEqual(limiter.stats().limit, 4);
+  });
+});
+
+describe('isOverloadError', () => {
+  it('Should recognize rate limits, server errors and timeouts', () => {
+    assert.ok(isOverloadError({ status: 503 }));
+    assert.ok(isOverloadError(new Error('Request timed out')));
+    assert.ok(isOverloadError(new Error('Portkey API error: 429 Too Many Requests')));
+    assert.ok(!isOverloadError({ status: 400 }));
+    assert.ok(!isOverloadError(new Error('Invalid API key')));
+  });
+});
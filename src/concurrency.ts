@@ -0,0 +1,112 @@
+// Process-wide limit on the number of network operations (SERP searches, LLM calls) in flight.
+//
+// The limit adapts to the provider with AIMD, like TCP congestion control: every successful call
+// grows it by 1/limit (about +1 per round of calls), and a rate limit, overload or timeout error
+// halves it. Calls much slower than the running average stop the growth, so the limit settles
+// below the point where the provider starts queueing. Searches and LLM calls have their own
+// limiter, since their latencies are not comparable.
+//
+// Only leaf operations may run through the limiter. A research branch that held a slot while
+// waiting for its sub-branches would deadlock the tree once every slot is held by a waiting parent.
+
+export type ConcurrencyStats = {
+  limit: number;
+  inFlight: number;
+  queued: number;
+  successes: number;
+  overloads: number;
+};
+
+const OverloadPattern =
+  /\b(429|500|502|503|504|529)\b|rate.?limit|too many requests|overloaded|timeout|timed out/i;
+
+export function isOverloadError(error: unknown): boolean {
+  const status = (error as any)?.status ?? (error as any)?.statusCode;
+  if (typeof status === 'number') {
+    return status === 429 || status >= 500;
+  }
+  return OverloadPattern.test(String((error as any)?.message ?? error));
+}
+
+export class AdaptiveLimiter {
+  private limit: number;
+  private inFlight = 0;
+  private queue: (() => void)[] = [];
+  private avgLatencyMs: number | undefined;
+  private successes = 0;
+  private overloads = 0;
+
+  constructor(
+    private readonly maxLimit: number,
+    private readonly minLimit = 1,
+    initialLimit = Math.ceil(maxLimit / 2),
+    // Calls slower than this multiple of the average latency don't grow the limit
+    private readonly slowCallFactor = 3,
+  ) {
+    this.limit = Math.min(maxLimit, Math.max(minLimit, initialLimit));
+  }
+
+  async run<T>(operation: () => Promise<T>): Promise<T> {
+    await this.acquire();
+    const start = performance.now();
+    try {
+      const result = await operation();
+      this.onSuccess(performance.now() - start);
+      return result;
+    } catch (e) {
+      if (isOverloadError(e)) {
+        this.onOverload();
+      }
+      throw e;
+    } finally {
+      this.release();
+    }
+  }
+
+  stats(): ConcurrencyStats {
+    return {
+      limit: Math.floor(this.limit),
+      inFlight: this.inFlight,
+      queued: this.queue.length,
+      successes: this.successes,
+      overloads: this.overloads,
+    };
+  }
+
+  private acquire(): Promise<void> {
+    if (this.inFlight < Math.floor(this.limit)) {
+      this.inFlight++;
+      return Promise.resolve();
+    }
+    return new Promise(resolve => this.queue.push(resolve));
+  }
+
+  private release() {
+    this.inFlight--;
+    // Wake as many waiters as the (possibly grown) limit allows, in arrival order
+    while (this.queue.length > 0 && this.inFlight < Math.floor(this.limit)) {
+      this.inFlight++;
+      this.queue.shift()!();
+    }
+  }
+
+  private onSuccess(latencyMs: number) {
+    this.successes++;
+    const avgLatencyMs = this.avgLatencyMs ?? latencyMs;
+    if (latencyMs <= avgLatencyMs * this.slowCallFactor) {
+      this.limit = Math.min(this.maxLimit, this.limit + 1 / this.limit);
+    }
+    this.avgLatencyMs = 0.8 * avgLatencyMs + 0.2 * latencyMs;
+  }
+
+  private onOverload() {
+    this.overloads++;
+    this.limit = Math.max(this.minLimit, this.limit / 2);
+  }
+}
+
+// RESEARCH_CONCURRENCY is the upper bound of each shared limit (default 8)
+const MaxConcurrency = Math.max(1, Number(process.env.RESEARCH_CONCURRENCY) || 8);
+
+export const searchLimiter = new AdaptiveLimiter(MaxConcurrency);
+export const llmLimiter = new AdaptiveLimiter(MaxConcurrency);
@@ -1,12 +1,14 @@
 import FirecrawlApp, { SearchResponse } from '@mendable/firecrawl-js';
 import { compact } from 'lodash-es';
-import pLimit from 'p-limit';
 import { z } from 'zod';
 
 import { o3MiniModel, trimPrompt } from './ai/providers';
 import { generateStructuredOutput } from './ai/structured-output';
+import { searchLimiter } from './concurrency';
 import { systemPrompt } from './prompt';
 import { OutputManager } from './output-manager';
+import { ResearchBudget } from './research-budget';
+import { cached, normalizeQuery } from './research-cache';
 
 // Initialize output manager for coordinated console/progress output
 const output = new OutputManager();
@@ -31,8 +33,15 @@ type ResearchResult = {
   visitedUrls: string[];
 };
 
-// increase this if you have higher API rate limits
-const ConcurrencyLimit = 2;
+// New learnings of one SERP query, reported as soon as they are extracted
+export type LearningsUpdate = {
+  query: string;
+  learnings: string[];
+  visitedUrls: string[];
+};
+
+// LLM outputs are cached per model, since another model would answer differently
+const ModelId = process.env.OPENAI_MODEL || 'o3-mini';
 
 // Initialize Firecrawl with optional API key and optional base url
 
@@ -46,13 +55,15 @@ async function generateSerpQueries({
   query,
   numQueries = 3,
   learnings,
+  model = o3MiniModel,
 }: {
   query: string;
   numQueries?: number;
   learnings?: string[];
+  model?: (prompt: string) => Promise<string>;
 }) {
   const res = await generateStructuredOutput({
-    model: o3MiniModel,
+    model,
     system: systemPrompt(),
     prompt: `Given the following prompt from the user, generate a list of SERP queries to research the topic. Return a maximum of ${numQueries} queries, but feel free to return less if the original prompt is clear.
 
@@ -93,11 +104,13 @@ async function processSerpResult({
   result,
   numLearnings = 3,
   numFollowUpQuestions = 3,
+  model = o3MiniModel,
 }: {
   query: string;
   result: SearchResponse;
   numLearnings?: number;
   numFollowUpQuestions?: number;
+  model?: (prompt: string) => Promise<string>;
 }) {
   const contents = compact(result.data.map(item => item.markdown)).map(
     content => trimPrompt(content, 25_000),
@@ -105,7 +118,7 @@ async function processSerpResult({
   log(`Ran ${query}, found ${contents.length} contents`);
 
   const res = await generateStructuredOutput({
-    model: o3MiniModel,
+    model,
     abortSignal: AbortSignal.timeout(60_000),
     system: systemPrompt(),
     prompt: `Given the following contents from a SERP search for the query <query>${query}</query>, generate a list of learnings from the contents. Return a maximum of ${numLearnings} learnings, but feel free to return less if the contents are clear. Make sure each learning is unique and not similar to each other. The learnings should be concise and to the point, as detailed and information dense as possible. Make sure to include any entities like people, places, companies, products, things, etc in the learnings, as well as any exact metrics, numbers, or dates. The learnings will be used to research the topic further.\n\n<contents>${contents
@@ -134,10 +147,12 @@ export async function writeFinalReport({
   prompt,
   learnings,
   visitedUrls,
+  model = o3MiniModel,
 }: {
   prompt: string;
   learnings: string[];
   visitedUrls: string[];
+  model?: (prompt: string) => Promise<string>;
 }) {
   const learningsString = trimPrompt(
     learnings
@@ -147,7 +162,7 @@ export async function writeFinalReport({
   );
 
   const res = await generateStructuredOutput({
-    model: o3MiniModel,
+    model,
     system: systemPrompt(),
     prompt: `Given the following prompt from the user, write a final report on the topic using the learnings from research. Make it as as detailed as possible, aim for 3 or more pages, include ALL the learnings from research:\n\n<prompt>${prompt}</prompt>\n\nHere are all the learnings from previous research:\n\n<learnings>\n${learningsString}\n</learnings>`,
     schema: z.object({
@@ -169,6 +184,9 @@ export async function deepResearch({
   learnings = [],
   visitedUrls = [],
   onProgress,
+  onLearnings,
+  signal,
+  budget,
 }: {
   query: string;
   breadth: number;
@@ -176,7 +194,19 @@ export async function deepResearch({
   learnings?: string[];
   visitedUrls?: string[];
   onProgress?: (progress: ResearchProgress) => void;
+  onLearnings?: (update: LearningsUpdate) => void;
+  // Once aborted, no new query is started and each branch returns what it has gathered so far
+  signal?: AbortSignal;
+  // Same as an abort once the budget is exhausted; its model is used for every LLM call
+  budget?: ResearchBudget;
 }): Promise<ResearchResult> {
+  const shouldStop = () => Boolean(signal?.aborted || budget?.exhausted());
+  const model = budget?.model ?? o3MiniModel;
+
+  if (shouldStop()) {
+    return { learnings, visitedUrls };
+  }
+
   const progress: ResearchProgress = {
     currentDepth: depth,
     totalDepth: depth,
@@ -191,43 +221,83 @@ export async function deepResearch({
     onProgress?.(progress);
   };
 
-  const serpQueries = await generateSerpQueries({
-    query,
-    learnings,
-    numQueries: breadth,
-  });
+  const serpQueries = await cached(
+    'serp-queries',
+    { model: ModelId, query, learnings, numQueries: breadth },
+    () =>
+      generateSerpQueries({
+        query,
+        learnings,
+        numQueries: breadth,
+        model,
+      }),
+  );
   
   reportProgress({
     totalQueries: serpQueries.length,
     currentQuery: serpQueries[0]?.query
   });
   
-  const limit = pLimit(ConcurrencyLimit);
-
+  // Branches are not limited here: searches and LLM calls go through the shared adaptive limiters
+  // (see concurrency.ts), which bound the whole tree without deadlocking parents on their children
   const results = await Promise.all(
     serpQueries.map(serpQuery =>
-      limit(async () => {
+      (async () => {
+        if (shouldStop()) {
+          return { learnings, visitedUrls };
+        }
         try {
-          const result = await firecrawl.search(serpQuery.query, {
-            timeout: 15000,
-            limit: 5,
-            scrapeOptions: { formats: ['markdown'] },
-          });
+          const result = await cached(
+            'search',
+            { query: normalizeQuery(serpQuery.query), limit: 5 },
+            async () => {
+              const response = await searchLimiter.run(() =>
+                firecrawl.search(serpQuery.query, {
+                  timeout: 15000,
+                  limit: 5,
+                  scrapeOptions: { formats: ['markdown'] },
+                }),
+              );
+              budget?.chargePages(response.data.length);
+              // Only what the pipeline reads is kept
+              return {
+                ...response,
+                data: response.data.map(({ url, markdown }) => ({ url, markdown })),
+              } as SearchResponse;
+            },
+          );
 
           // Collect URLs from this search
           const newUrls = compact(result.data.map(item => item.url));
           const newBreadth = Math.ceil(breadth / 2);
           const newDepth = depth - 1;
 
-          const newLearnings = await processSerpResult({
-            query: serpQuery.query,
-            result,
-            numFollowUpQuestions: newBreadth,
-          });
+          const newLearnings = await cached(
+            'learnings',
+            {
+              model: ModelId,
+              query: normalizeQuery(serpQuery.query),
+              urls: newUrls,
+              numFollowUpQuestions: newBreadth,
+            },
+            () =>
+              processSerpResult({
+                query: serpQuery.query,
+                result,
+                numFollowUpQuestions: newBreadth,
+                model,
+              }),
+          );
           const allLearnings = [...learnings, ...newLearnings.learnings];
           const allUrls = [...visitedUrls, ...newUrls];
+          onLearnings?.({
+            query: serpQuery.query,
+            learnings: newLearnings.learnings,
+            visitedUrls: newUrls,
+          });
 
-          if (newDepth > 0) {
+          // Out of budget: keep this level's learnings but don't go deeper
+          if (newDepth > 0 && !shouldStop()) {
             log(
               `Researching deeper, breadth: ${newBreadth}, depth: ${newDepth}`,
             );
@@ -251,6 +321,9 @@ export async function deepResearch({
               learnings: allLearnings,
               visitedUrls: allUrls,
               onProgress,
+              onLearnings,
+              signal,
+              budget,
             });
           } else {
             reportProgress({
@@ -277,7 +350,7 @@ export async function deepResearch({
             visitedUrls: [],
           };
         }
-      }),
+      })(),
     ),
   );
 
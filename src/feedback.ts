@@ -7,12 +7,14 @@ import { systemPrompt } from './prompt';
 export async function generateFeedback({
   query,
   numQuestions = 3,
+  model = o3MiniModel,
 }: {
   query: string;
   numQuestions?: number;
+  model?: (prompt: string) => Promise<string>;
 }) {
   const userFeedback = await generateStructuredOutput({
-    model: o3MiniModel,
+    model,
     system: systemPrompt(),
     prompt: `Given the following query from the user, ask some follow up questions to clarify the research direction. Return a maximum of ${numQuestions} questions, but feel free to return less if the original query is clear: <query>${query}</query>`,
     schema: z.object({
@@ -4,14 +4,22 @@ export class OutputManager {
   private progressLines: number = 4;
   private progressArea: string[] = [];
   private initialized: boolean = false;
+  // In the research worker stdout carries the JSON-RPC protocol, so logs go to stderr and
+  // progress is reported to the caller as notifications instead of being drawn
+  private workerMode: boolean = Boolean(process.env.RESEARCH_WORKER);
   
   constructor() {
+    if (this.workerMode) return;
     // Initialize terminal
     process.stdout.write('\n'.repeat(this.progressLines));
     this.initialized = true;
   }
   
   log(...args: any[]) {
+    if (this.workerMode) {
+      console.error(...args);
+      return;
+    }
     // Move cursor up to progress area
     if (this.initialized) {
       process.stdout.write(`\x1B[${this.progressLines}A`);
@@ -27,6 +35,7 @@ export class OutputManager {
   }
   
   updateProgress(progress: ResearchProgress) {
+    if (this.workerMode) return;
     this.progressArea = [
       `Depth:    [${this.getProgressBar(progress.totalDepth - progress.currentDepth, progress.totalDepth)}] ${Math.round((progress.totalDepth - progress.currentDepth) / progress.totalDepth * 100)}%`,
       `Breadth:  [${this.getProgressBar(progress.totalBreadth - progress.currentBreadth, progress.totalBreadth)}] ${Math.round((progress.totalBreadth - progress.currentBreadth) / progress.totalBreadth * 100)}%`,
@@ -0,0 +1,86 @@
+import { o3MiniModel } from './ai/providers';
+
+// Limits of one research job. A job that runs out of budget degrades instead of failing: it starts
+// no new query and goes no deeper, and its report is written from the learnings gathered so far.
+// The final report is not limited, so an exhausted job still produces an answer.
+export type ResearchBudgetLimits = {
+  deadlineMs?: number;
+  maxLlmCalls?: number;
+  maxTokens?: number;
+  maxPages?: number;
+};
+
+// Limits as sent by the Python side (seconds for the deadline), unset limits being absent or null
+export function budgetLimits(params: {
+  deadlineS?: number | null;
+  maxLlmCalls?: number | null;
+  maxTokens?: number | null;
+  maxPages?: number | null;
+}): ResearchBudgetLimits {
+  return {
+    deadlineMs: params.deadlineS != null ? params.deadlineS * 1000 : undefined,
+    maxLlmCalls: params.maxLlmCalls ?? undefined,
+    maxTokens: params.maxTokens ?? undefined,
+    maxPages: params.maxPages ?? undefined,
+  };
+}
+
+export type ResearchBudgetUsage = {
+  elapsedMs: number;
+  llmCalls: number;
+  tokens: number;
+  pages: number;
+  // Which limit stopped the research, if any
+  exhausted: string | null;
+};
+
+export class ResearchBudget {
+  private readonly startedAt = Date.now();
+  private llmCalls = 0;
+  private tokens = 0;
+  private pages = 0;
+
+  constructor(private readonly limits: ResearchBudgetLimits = {}) {}
+
+  // Reason the budget is spent, or undefined while research may go on
+  exhausted(): string | undefined {
+    const { deadlineMs, maxLlmCalls, maxTokens, maxPages } = this.limits;
+    if (deadlineMs !== undefined && Date.now() - this.startedAt >= deadlineMs) {
+      return 'deadline';
+    }
+    if (maxLlmCalls !== undefined && this.llmCalls >= maxLlmCalls) {
+      return 'llm_calls';
+    }
+    if (maxTokens !== undefined && this.tokens >= maxTokens) {
+      return 'tokens';
+    }
+    if (maxPages !== undefined && this.pages >= maxPages) {
+      return 'pages';
+    }
+    return undefined;
+  }
+
+  // The research model, counting its calls and tokens against the budget
+  readonly model = async (prompt: string) => {
+    this.llmCalls++;
+    return o3MiniModel(prompt, {
+      onUsage: usage => {
+        this.tokens += usage.total_tokens;
+      },
+    });
+  };
+
+  chargePages(count: number) {
+    this.pages += count;
+  }
+
+  usage(): ResearchBudgetUsage {
+    return {
+      elapsedMs: Date.now() - this.startedAt,
+      llmCalls: this.llmCalls,
+      tokens: this.tokens,
+      pages: this.pages,
+      exhausted: this.exhausted() ?? null,
+    };
+  }
+}
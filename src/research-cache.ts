@@ -0,0 +1,82 @@
+import { createHash } from 'crypto';
+import * as fs from 'fs/promises';
+import * as path from 'path';
+
+// Persistent memo of research steps, shared by every run on this machine: SERP results per
+// normalized query, and the LLM outputs derived from them (queries, learnings).
+//
+// Entries are JSON files under RESEARCH_CACHE_DIR (default .research-cache), one directory per
+// namespace, named by the hash of their key: {"key": ..., "createdAt": <ms>, "value": ...}.
+// They expire after RESEARCH_CACHE_TTL seconds (default 7 days). RESEARCH_CACHE=off disables the
+// cache. scripts/research_cache.py inspects and prunes it.
+
+const CacheDir = process.env.RESEARCH_CACHE_DIR || '.research-cache';
+const TtlMs = (Number(process.env.RESEARCH_CACHE_TTL) || 7 * 24 * 3600) * 1000;
+const Enabled = process.env.RESEARCH_CACHE !== 'off';
+
+// Computations in progress, so concurrent branches asking for the same entry share one call
+const inFlight = new Map<string, Promise<unknown>>();
+
+export function normalizeQuery(query: string) {
+  return query
+    .toLowerCase()
+    .replace(/\s+/g, ' ')
+    .replace(/^[\s"'.,;:!?]+|[\s"'.,;:!?]+$/g, '');
+}
+
+function entryPath(namespace: string, key: unknown) {
+  const hash = createHash('sha256').update(JSON.stringify(key)).digest('hex');
+  return path.join(CacheDir, namespace, `${hash}.json`);
+}
+
+async function read<T>(file: string): Promise<T | undefined> {
+  try {
+    const entry = JSON.parse(await fs.readFile(file, 'utf-8'));
+    if (Date.now() - entry.createdAt <= TtlMs) {
+      return entry.value as T;
+    }
+  } catch {
+    // Missing or corrupt entries are recomputed
+  }
+  return undefined;
+}
+
+async function write(file: string, key: unknown, value: unknown) {
+  await fs.mkdir(path.dirname(file), { recursive: true });
+  // Write then rename, so concurrent readers never see a partial file
+  const tmp = `${file}.${process.pid}.${Math.random().toString(36).slice(2)}.tmp`;
+  await fs.writeFile(tmp, JSON.stringify({ key, createdAt: Date.now(), value }), 'utf-8');
+  await fs.rename(tmp, file);
+}
+
+export async function cached<T>(
+  namespace: string,
+  key: unknown,
+  compute: () => Promise<T>,
+): Promise<T> {
+  if (!Enabled) {
+    return compute();
+  }
+  const file = entryPath(namespace, key);
+  const pending = inFlight.get(file);
+  if (pending) {
+    return pending as Promise<T>;
+  }
+
+  const promise = (async () => {
+    const hit = await read<T>(file);
+    if (hit !== undefined) {
+      return hit;
+    }
+    const value = await compute();
+    // A failed write only costs a future recomputation
+    await write(file, key, value).catch(() => {});
+    return value;
+  })();
+  inFlight.set(file, promise);
+  try {
+    return await promise;
+  } finally {
+    inFlight.delete(file);
+  }
+}
@@ -0,0 +1,122 @@
+import {
+  deepResearch,
+  LearningsUpdate,
+  ResearchProgress,
+  writeFinalReport,
+} from './deep-research';
+import { generateFeedback } from './feedback';
+import {
+  ResearchBudget,
+  ResearchBudgetLimits,
+  ResearchBudgetUsage,
+} from './research-budget';
+
+export type ResearchJobResult = {
+  report: string;
+  learnings: string[];
+  visitedUrls: string[];
+  // True when the job was aborted or ran out of budget before the research tree was complete
+  stopped: boolean;
+  budget: ResearchBudgetUsage;
+  // Wall-clock milliseconds spent in each phase of the job
+  timings: {
+    feedbackMs: number;
+    researchMs: number;
+    reportMs: number;
+    totalMs: number;
+  };
+};
+
+// Full research pipeline shared by the CLI (run.ts) and the worker (worker.ts): follow-up questions,
+// the recursive research itself, then the final report
+export async function runResearchJob({
+  query,
+  breadth,
+  depth,
+  onProgress,
+  onLearnings,
+  signal,
+  limits,
+  log = () => {},
+}: {
+  query: string;
+  breadth: number;
+  depth: number;
+  onProgress?: (progress: ResearchProgress) => void;
+  onLearnings?: (update: LearningsUpdate) => void;
+  // Aborting stops the research early; the report is still written from what was gathered
+  signal?: AbortSignal;
+  limits?: ResearchBudgetLimits;
+  log?: (...args: any[]) => void;
+}): Promise<ResearchJobResult> {
+  const start = performance.now();
+  const budget = new ResearchBudget(limits);
+
+  log(`Creating research plan...`);
+
+  // Generate follow-up questions
+  const followUpQuestions = await generateFeedback({
+    query: query,
+    model: budget.model,
+  });
+  const feedbackDone = performance.now();
+
+  // Since we can't get interactive answers, we'll modify the combined query
+  const combinedQuery = `
+Initial Query: ${query}
+Research Parameters:
+- Breadth: ${breadth}
+- Depth: ${depth}
+Follow-up Questions to Consider:
+${followUpQuestions.map((q: string) => `- ${q}`).join('\n')}
+`;
+
+  log('\nResearching your topic...');
+  log('\nStarting research with progress tracking...\n');
+
+  const { learnings, visitedUrls } = await deepResearch({
+    query: combinedQuery,
+    breadth,
+    depth,
+    onProgress,
+    onLearnings,
+    signal,
+    budget,
+  });
+  // Read before the report, which is not limited and may use up the rest of the budget
+  const exhausted = budget.exhausted();
+  const stopped = Boolean(signal?.aborted || exhausted);
+  const researchDone = performance.now();
+
+  log(`\n\nLearnings:\n\n${learnings.join('\n')}`);
+  log(
+    `\n\nVisited URLs (${visitedUrls.length}):\n\n${visitedUrls.join('\n')}`,
+  );
+  log('Writing final report...');
+
+  // Nothing to report on if the job was stopped before learning anything
+  const report =
+    stopped && learnings.length === 0
+      ? ''
+      : await writeFinalReport({
+          prompt: combinedQuery,
+          learnings,
+          visitedUrls,
+          model: budget.model,
+        });
+  const reportDone = performance.now();
+
+  return {
+    report,
+    learnings,
+    visitedUrls,
+    stopped,
+    budget: { ...budget.usage(), exhausted: exhausted ?? null },
+    timings: {
+      feedbackMs: Math.round(feedbackDone - start),
+      researchMs: Math.round(researchDone - feedbackDone),
+      reportMs: Math.round(reportDone - researchDone),
+      totalMs: Math.round(reportDone - start),
+    },
+  };
+}
@@ -1,7 +1,7 @@
 import * as fs from 'fs/promises';
-import { deepResearch, writeFinalReport } from './deep-research';
-import { generateFeedback } from './feedback';
 import { OutputManager } from './output-manager';
+import { budgetLimits } from './research-budget';
+import { runResearchJob } from './research-job';
 
 const output = new OutputManager();
 
@@ -12,64 +12,68 @@ function log(...args: any[]) {
 async function run() {
   // Get command line arguments
   const args = process.argv.slice(2);
-  
+
+  // --name <value> options, removed from the positional arguments
+  const takeOption = (name: string) => {
+    const index = args.indexOf(name);
+    if (index === -1) return undefined;
+    const [, value] = args.splice(index, 2);
+    return value;
+  };
+  const numberOption = (name: string) => {
+    const value = takeOption(name);
+    return value !== undefined ? Number(value) : undefined;
+  };
+
+  // --result-file <path>: write the structured result as JSON to this file, so concurrent
+  // invocations don't share output.md
+  const resultFile = takeOption('--result-file');
+  const limits = budgetLimits({
+    deadlineS: numberOption('--deadline-s'),
+    maxLlmCalls: numberOption('--max-llm-calls'),
+    maxTokens: numberOption('--max-tokens'),
+    maxPages: numberOption('--max-pages'),
+  });
+
   // Parse arguments
   const query = args[0];
   const breadth = parseInt(args[1] ?? '', 10) || 4;  // default 4
   const depth = parseInt(args[2] ?? '', 10) || 2;    // default 2
 
   if (!query) {
-    console.error('Usage: npm start "<research query>" [breadth] [depth]');
+    console.error(
+      'Usage: npm start "<research query>" [breadth] [depth] [--result-file <path>] ' +
+        '[--deadline-s <s>] [--max-llm-calls <n>] [--max-tokens <n>] [--max-pages <n>]',
+    );
     console.error('Example: npm start "AI advances in 2024" 4 2');
     process.exit(1);
   }
 
-  log(`Creating research plan...`);
-
-  // Generate follow-up questions
-  const followUpQuestions = await generateFeedback({
-    query: query,
-  });
-
-  // Since we can't get interactive answers, we'll modify the combined query
-  const combinedQuery = `
-Initial Query: ${query}
-Research Parameters:
-- Breadth: ${breadth}
-- Depth: ${depth}
-Follow-up Questions to Consider:
-${followUpQuestions.map((q: string) => `- ${q}`).join('\n')}
-`;
-
-  log('\nResearching your topic...');
-  log('\nStarting research with progress tracking...\n');
-  
-  const { learnings, visitedUrls } = await deepResearch({
-    query: combinedQuery,
+  const result = await runResearchJob({
+    query,
     breadth,
     depth,
-    onProgress: (progress) => {
+    onProgress: progress => {
       output.updateProgress(progress);
     },
+    limits,
+    log,
   });
 
-  log(`\n\nLearnings:\n\n${learnings.join('\n')}`);
-  log(
-    `\n\nVisited URLs (${visitedUrls.length}):\n\n${visitedUrls.join('\n')}`,
-  );
-  log('Writing final report...');
-
-  const report = await writeFinalReport({
-    prompt: combinedQuery,
-    learnings,
-    visitedUrls,
-  });
+  if (resultFile) {
+    await fs.writeFile(resultFile, JSON.stringify(result), 'utf-8');
+    console.log(`\nResult has been saved to ${resultFile}`);
+    return;
+  }
 
   // Save report to file
-  await fs.writeFile('output.md', report, 'utf-8');
+  await fs.writeFile('output.md', result.report, 'utf-8');
 
-  console.log(`\n\nFinal Report:\n\n${report}`);
+  console.log(`\n\nFinal Report:\n\n${result.report}`);
   console.log('\nReport has been saved to output.md');
 }
 
-run().catch(console.error);
+run().catch(e => {
+  console.error(e);
+  process.exitCode = 1;
+});
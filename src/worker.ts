@@ -0,0 +1,140 @@
+import * as readline from 'readline';
+
+import { llmLimiter, searchLimiter } from './concurrency';
+import { budgetLimits } from './research-budget';
+import { runResearchJob } from './research-job';
+
+// Long-lived research process driven by scripts/research_worker.py.
+//
+// Speaks newline-delimited JSON-RPC 2.0 over stdio: one request per line on stdin, one response or
+// notification per line on stdout. Requests run concurrently, and while a "research" request runs
+// its progress is sent as "progress" notifications carrying the request id, as well as its new
+// learnings as "learnings" notifications if it was sent with "stream": true. Logs go to stderr,
+// which requires RESEARCH_WORKER to be set in the environment (see OutputManager).
+
+type JsonRpcRequest = {
+  jsonrpc: '2.0';
+  id?: number | string;
+  method: string;
+  params?: any;
+};
+
+// stdout is reserved for the protocol, so stray console.log calls must not end up there
+console.log = console.error;
+console.info = console.error;
+
+function send(message: object) {
+  process.stdout.write(JSON.stringify({ jsonrpc: '2.0', ...message }) + '\n');
+}
+
+// Abort controllers of the running research requests, for "cancel"
+const controllers = new Map<number | string, AbortController>();
+
+async function research(
+  id: number | string,
+  {
+    query,
+    breadth = 4,
+    depth = 2,
+    stream = false,
+    ...limits
+  }: {
+    query: string;
+    breadth?: number;
+    depth?: number;
+    stream?: boolean;
+    deadlineS?: number;
+    maxLlmCalls?: number;
+    maxTokens?: number;
+    maxPages?: number;
+  },
+) {
+  if (!query) {
+    throw new Error('Missing "query" parameter');
+  }
+
+  const controller = new AbortController();
+  controllers.set(id, controller);
+  try {
+    return await runResearchJob({
+      query,
+      breadth,
+      depth,
+      onProgress: progress => {
+        send({ method: 'progress', params: { id, progress } });
+      },
+      // With stream, learnings are sent as soon as they are extracted
+      onLearnings: stream
+        ? update => send({ method: 'learnings', params: { id, ...update } })
+        : undefined,
+      signal: controller.signal,
+      limits: budgetLimits(limits),
+      log: console.error,
+    });
+  } finally {
+    controllers.delete(id);
+  }
+}
+
+// Stop a research request early: it still answers, with a report of what it gathered so far
+async function cancel(_id: number | string, { id }: { id: number | string }) {
+  const controller = controllers.get(id);
+  controller?.abort();
+  return controller !== undefined;
+}
+
+const methods: Record<string, (id: number | string, params: any) => Promise<any>> = {
+  research,
+  cancel,
+  ping: async () => 'pong',
+  stats: async () => ({ search: searchLimiter.stats(), llm: llmLimiter.stats() }),
+  shutdown: async () => {
+    setImmediate(() => process.exit(0));
+    return null;
+  },
+};
+
+async function handle(request: JsonRpcRequest) {
+  const { id, method, params } = request;
+  const handler = methods[method];
+  if (!handler) {
+    if (id !== undefined) {
+      send({ id, error: { code: -32601, message: `Unknown method: ${method}` } });
+    }
+    return;
+  }
+  try {
+    const result = await handler(id ?? '', params ?? {});
+    if (id !== undefined) {
+      send({ id, result });
+    }
+  } catch (e: any) {
+    console.error(`Error handling ${method} request ${id}:`, e);
+    if (id !== undefined) {
+      send({
+        id,
+        error: { code: -32000, message: e?.message ?? String(e), data: e?.stack },
+      });
+    }
+  }
+}
+
+const lines = readline.createInterface({ input: process.stdin });
+
+lines.on('line', line => {
+  if (!line.trim()) return;
+  let request: JsonRpcRequest;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    send({ id: null, error: { code: -32700, message: `Parse error: ${e}` } });
+    return;
+  }
+  // Not awaited: requests are served concurrently
+  void handle(request);
+});
+
+// The parent closed our stdin, it no longer waits for any result
+lines.on('close', () => process.exit(0));
+
+send({ method: 'ready', params: { pid: process.pid } });
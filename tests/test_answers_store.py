@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from scripts.answers_store import AnswersStore
+
+
+def _append_after_crash(path):
+    with AnswersStore(str(path)) as store:
+        store.append({"task_id": "a", "prediction": "1"})
+    # A crash in the middle of the next write
+    with open(path, "ab") as f:
+        f.write(b'{"task_id": "b", "predic')
+    with AnswersStore(str(path)) as store:
+        assert store.done_task_ids() == {"a"}
+        store.append({"task_id": "c", "prediction": "3"})
+
+
+def test_append_after_truncated_write_moves_the_fragment_away(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    _append_after_crash(path)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["task_id"] for record in records] == ["a", "c"]
+    assert (tmp_path / "answers.jsonl.partial").read_bytes() == b'{"task_id": "b", "predic\n'
+
+
+def test_file_loads_with_pandas_after_truncated_write(tmp_path):
+    pd = pytest.importorskip("pandas")
+    path = tmp_path / "answers.jsonl"
+    _append_after_crash(path)
+    assert list(pd.read_json(path, lines=True)["task_id"]) == ["a", "c"]
+
+
+def test_refresh_skips_lines_that_are_not_objects(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    path.write_text('[1, 2]\n"text"\n{"task_id": "a"}\n')
+    store = AnswersStore(str(path))
+    assert store.done_task_ids() == {"a"}
+    assert store.get("a") == {"task_id": "a"}
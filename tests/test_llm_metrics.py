@@ -0,0 +1,48 @@
+import threading
+from types import SimpleNamespace
+
+from scripts.llm_metrics import InstrumentedModel, call_context, get_recorder
+
+
+class SharedModel:
+    """Model whose last_*_token_count counters are overwritten by whichever call finishes last."""
+
+    model_id = "gpt-4o"
+
+    def __init__(self):
+        self.last_input_token_count = None
+        self.last_output_token_count = None
+        self._barrier = threading.Barrier(2)
+
+    def __call__(self, messages, prompt_tokens, completion_tokens):
+        self.last_input_token_count = prompt_tokens
+        self.last_output_token_count = completion_tokens
+        # Both calls have set the counters before either returns
+        self._barrier.wait(timeout=5)
+        self.last_input_token_count = self.last_output_token_count = 0
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return SimpleNamespace(content="ok", raw=SimpleNamespace(usage=usage))
+
+
+def test_usage_is_recorded_per_call_when_model_is_shared():
+    get_recorder().clear()
+    model = InstrumentedModel(SharedModel())
+
+    def call(task_id, prompt_tokens, completion_tokens):
+        with call_context(task_id=task_id):
+            model([], prompt_tokens, completion_tokens)
+
+    threads = [
+        threading.Thread(target=call, args=("a", 100, 10)),
+        threading.Thread(target=call, args=("b", 2000, 300)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    (record_a,) = get_recorder().records(task_id="a")
+    (record_b,) = get_recorder().records(task_id="b")
+    assert (record_a.prompt_tokens, record_a.completion_tokens) == (100, 10)
+    assert (record_b.prompt_tokens, record_b.completion_tokens) == (2000, 300)
+    get_recorder().clear()
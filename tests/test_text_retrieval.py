@@ -0,0 +1,25 @@
+import pytest
+
+from scripts.text_inspector_tool import TextInspectorTool
+from scripts.text_retrieval import chunk_text
+
+
+def test_chunk_text_splits_long_paragraphs():
+    chunks = chunk_text("word " * 2000, chunk_tokens=100, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert chunks[0].startswith("word word")
+
+
+@pytest.mark.parametrize("chunk_tokens", [0, -1])
+def test_chunk_text_rejects_non_positive_chunk_size(chunk_tokens):
+    with pytest.raises(ValueError, match="chunk_tokens"):
+        chunk_text("some text", chunk_tokens=chunk_tokens)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"chunk_tokens": 0}, {"retrieval_token_budget": 0}, {"map_chunk_tokens": -5}],
+)
+def test_text_inspector_rejects_non_positive_sizes(kwargs):
+    with pytest.raises(ValueError, match=next(iter(kwargs))):
+        TextInspectorTool(None, 100000, mode="retrieval", **kwargs)